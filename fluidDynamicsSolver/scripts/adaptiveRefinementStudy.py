@@ -0,0 +1,120 @@
+'''
+Kelvin-Helmholtz test case on a uniform fine mesh, a uniform coarse mesh, and the coarse mesh
+with adaptive refinement around the shear interface (with and without refluxing). Reports the
+number of cells, the wall-clock time and the RMS tracer difference from the uniform fine run.
+The change in total mass of the adaptive runs is compared on a mesh which is also periodic in z,
+as the boundary conditions at walls (see setBoundaryConditions) do not conserve mass themselves.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.adaptiveMeshRefinement import adaptiveMeshRefinement
+
+from kelvinHelmholtz import initialConditions, eulerSolver
+
+def solver(fvc, state):
+    g = fvc.mesh.volVectorField.copy(order="K")
+    return eulerSolver(fvc, g, state)
+
+def mass(rho, mesh):
+    return rho.sum()*mesh.dx*mesh.dy*mesh.dz
+
+def runUniform(mesh, state, dt, tEnd):
+    '''
+    Run on a single mesh to tEnd with a fixed timestep.
+    
+    Returns
+    elapsed: Wall-clock time (s) of the solver loop
+    '''
+    step = solver(finiteVolumeFunctions(mesh), state)
+    
+    timeInit = time.time()
+    for i in xrange(int(round(tEnd/dt))):
+        step(dt)
+    
+    return time.time() - timeInit
+
+def runAdaptive(mesh, fineState, dt, tEnd, conservative):
+    '''
+    Run with adaptive refinement to tEnd with a fixed (coarse) timestep.
+    
+    Returns
+    refinement: adaptiveMeshRefinement holding the fields at tEnd
+    cells:      Number of cells, averaged over the steps
+    elapsed:    Wall-clock time (s) of the solver loop
+    '''
+    refinement = adaptiveMeshRefinement(mesh, solver, conservative=conservative)
+    u, rho, tracer = initialConditions(mesh)
+    refinement.start([rho, u, tracer], fineState)
+    
+    cells = []
+    timeInit = time.time()
+    for i in xrange(int(round(tEnd/dt))):
+        refinement.step(dt)
+        cells.append(refinement.nCells())
+    
+    return refinement, np.mean(cells), time.time() - timeInit
+
+def conservation(dt, tEnd, ratio=2):
+    "Relative change in total mass of the adaptive runs with and without refluxing, without walls"
+    fineMesh = cubeMesh2D(xPeriodic=True, zPeriodic=True)
+    coarseMesh = cubeMesh2D(xPeriodic=True, zPeriodic=True, dx=2e2, dz=2e2)
+    
+    u, rho, tracer = initialConditions(fineMesh)
+    initialMass = mass(rho, fineMesh)
+    fineState = [rho, u, tracer]
+    
+    changes = []
+    for conservative in [[0], []]:
+        refinement, cells, elapsed = runAdaptive(coarseMesh, fineState, ratio*dt, tEnd, conservative)
+        changes.append((mass(refinement.refined(0), fineMesh)-initialMass)/initialMass)
+    
+    return changes
+
+def main(dt=0.05, tEnd=100.):
+    fineMesh = cubeMesh2D(xPeriodic=True)
+    coarseMesh = cubeMesh2D(xPeriodic=True, dx=2e2, dz=2e2)
+    ratio = 2
+    
+    u, rho, tracer = initialConditions(fineMesh)
+    
+    fineState = [rho.copy(), u.copy(order="K"), tracer.copy()]
+    elapsed = runUniform(fineMesh, [rho, u, tracer], dt, tEnd)
+    tracerReference = tracer
+    results = [("uniform fine", fineMesh.xNCells*fineMesh.zNCells, elapsed, 0.)]
+    
+    refinement = adaptiveMeshRefinement(coarseMesh, solver, ratio=ratio)
+    u, rho, tracer = initialConditions(coarseMesh)
+    for field, fineField in zip([rho, u, tracer], fineState):
+        field[...] = refinement.restrict(fineField)
+    elapsed = runUniform(coarseMesh, [rho, u, tracer], ratio*dt, tEnd)
+    difference = np.sqrt(np.mean((refinement.prolong(tracer) - tracerReference)**2))
+    results.append(("uniform coarse", coarseMesh.xNCells*coarseMesh.zNCells, elapsed, difference))
+    
+    for name, conservative in [("adaptive", [0]), ("no refluxing", [])]:
+        refinement, cells, elapsed = runAdaptive(coarseMesh, fineState, ratio*dt, tEnd, conservative)
+        difference = np.sqrt(np.mean((refinement.refined(2) - tracerReference)**2))
+        results.append((name, cells, elapsed, difference))
+    
+    print "{:>15} {:>10} {:>10} {:>14}".format("mesh", "cells", "time (s)", "tracer diff")
+    for name, cells, elapsed, difference in results:
+        print "{:>15} {:>10.0f} {:>10.2f} {:>14.3e}".format(name, cells, elapsed, difference)
+    
+    refluxed, notRefluxed = conservation(dt, tEnd, ratio)
+    print "\nMass change, periodic in x and z: {:.3e} with refluxing, {:.3e} without".format(refluxed, notRefluxed)
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
@@ -0,0 +1,97 @@
+'''
+Sweep of the advection scheme on the Kelvin-Helmholtz test case, branched from one spun-up
+checkpoint instead of repeating the spin-up for every run. The spin-up is reused if its
+checkpoint already exists. Also checks that a run restarted from the checkpoint matches an
+uninterrupted run bit for bit.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.folders import folders
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.runSettings import runSettings
+from src.objects.checkpoint import checkpoint
+
+from kelvinHelmholtz import initialConditions, eulerSolver, R, T
+
+soundSpeed = np.sqrt(R*T)
+
+def setUp(mesh, scheme, tSpinUp, tEnd):
+    '''
+    Fields, solver and adaptive runSettings for a run. Plots are due at tSpinUp, so every run
+    lands exactly on the spin-up time.
+    '''
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    
+    u, rho, tracer = initialConditions(mesh)
+    state = [rho, u, tracer]
+    
+    step = eulerSolver(fvc, g, state, scheme=scheme)
+    simulation = runSettings(dt=0.01, tEnd=tEnd, plotInterval=tSpinUp, adaptive=True)
+    
+    return state, step, simulation
+
+def advance(mesh, state, step, simulation, tStop):
+    "Run until tStop (or the end time), returning the wall-clock time"
+    timeInit = time.time()
+    while simulation.currentTime < tStop and simulation.updateTime():
+        step(simulation.dt)
+        simulation.adjustTimestep(state[1], mesh, soundSpeed)
+    
+    return time.time() - timeInit
+
+def main(schemes=["upwind", "minmod", "vanLeer", "superbee"], tSpinUp=100., tEnd=150.):
+    folder = folders( folderScripts=os.path.dirname(os.path.realpath(__file__)) )
+    spinUp = checkpoint(os.path.join(folder.outputs, "sweepCheckpoint"), names=["rho", "u", "tracer"])
+    
+    if spinUp.exists() and spinUp.description()["simulation"]["currentTime"] == tSpinUp:
+        print "Reusing the spin-up checkpoint"
+        spinUpTime = 0.
+    else:
+        mesh = cubeMesh2D(xPeriodic=True)
+        state, step, simulation = setUp(mesh, schemes[0], tSpinUp, tEnd)
+        simulation.adjustTimestep(state[1], mesh, soundSpeed)
+        spinUpTime = advance(mesh, state, step, simulation, tSpinUp)
+        spinUp.save(mesh, simulation, state)
+        print "Spin-up to t={}s: {:.2f}s".format(tSpinUp, spinUpTime)
+    
+    print "\n{:>10} {:>10} {:>14}".format("scheme", "time (s)", "tracer var")
+    branchTime = 0.
+    results = {}
+    for scheme in schemes:
+        mesh = spinUp.mesh()
+        state, step, simulation = setUp(mesh, scheme, tSpinUp, tEnd)
+        spinUp.restore(mesh, simulation, state)
+        
+        elapsed = advance(mesh, state, step, simulation, tEnd)
+        branchTime += elapsed
+        results[scheme] = state
+        print "{:>10} {:>10.2f} {:>14.4e}".format(scheme, elapsed, np.var(state[2]))
+    
+    print "\nSweep: {:.2f}s, repeating the spin-up for every run would add {:.2f}s".format(
+        spinUpTime + branchTime, (len(schemes) - 1)*spinUpTime
+    )
+    
+    # Uninterrupted run of the first scheme, to compare with its restarted run
+    mesh = cubeMesh2D(xPeriodic=True)
+    state, step, simulation = setUp(mesh, schemes[0], tSpinUp, tEnd)
+    simulation.adjustTimestep(state[1], mesh, soundSpeed)
+    advance(mesh, state, step, simulation, tEnd)
+    difference = max(np.abs(field - restarted).max() for field, restarted in zip(state, results[schemes[0]]))
+    print "Restarted and uninterrupted {} runs differ by {}".format(schemes[0], difference)
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
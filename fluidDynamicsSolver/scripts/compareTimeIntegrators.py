@@ -0,0 +1,80 @@
+'''
+Convergence and throughput comparison of the time integration schemes on the
+Kelvin-Helmholtz test case. Every run is compared with a fine-timestep
+lowStorageRK4 reference solution at the same end time.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.runSettings import runSettings
+from src.objects.timeIntegrator import timeIntegrator
+
+from kelvinHelmholtz import initialConditions, eulerSolver, rightHandSide, boundaryConditions
+
+def runCase(scheme, dt, tEnd):
+    '''
+    Run the Kelvin-Helmholtz case to tEnd with a fixed timestep.
+    
+    Returns
+    u, rho, tracer: Fields at tEnd
+    steps:          Number of timesteps taken
+    elapsed:        Wall-clock time (s) of the solver loop
+    '''
+    mesh = cubeMesh2D(xPeriodic=True)
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    
+    u, rho, tracer = initialConditions(mesh)
+    state = [rho, u, tracer]
+    
+    if scheme == "euler":
+        step = eulerSolver(fvc, g, state)
+    else:
+        integrator = timeIntegrator(
+            state, rightHandSide(fvc, g, state), scheme=scheme, 
+            boundaryConditions=boundaryConditions(fvc)
+        )
+        step = lambda dt: integrator.step(state, dt)
+    
+    simulation = runSettings(dt=dt, tEnd=tEnd)
+    steps = int(round(tEnd/dt))
+    
+    timeInit = time.time()
+    for i in xrange(steps):
+        step(simulation.dt)
+    elapsed = time.time() - timeInit
+    
+    return u, rho, tracer, steps, elapsed
+
+def main(tEnd=20., timesteps=[0.01, 0.05, 0.1, 0.2, 0.4]):
+    print "Computing reference solution"
+    uRef, rhoRef, tracerRef, steps, elapsed = runCase("lowStorageRK4", 0.025, tEnd)
+    
+    print "\n{:>14} {:>6} {:>7} {:>10} {:>12} {:>12} {:>12}".format(
+        "scheme", "dt", "steps", "time (s)", "steps/s", "error u", "error rho"
+    )
+    for scheme in ["euler", "sspRK2", "sspRK3", "lowStorageRK4"]:
+        for dt in timesteps:
+            u, rho, tracer, steps, elapsed = runCase(scheme, dt, tEnd)
+            
+            errorU = np.sqrt(np.mean((u-uRef)**2))
+            errorRho = np.sqrt(np.mean((rho-rhoRef)**2))
+            print "{:>14} {:>6} {:>7} {:>10.2f} {:>12.1f} {:>12.3e} {:>12.3e}".format(
+                scheme, dt, steps, elapsed, steps/elapsed, errorU, errorRho
+            )
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
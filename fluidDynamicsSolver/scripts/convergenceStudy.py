@@ -0,0 +1,72 @@
+'''
+Early termination of the Kelvin-Helmholtz case with runSettings.checkConvergence: the time at
+which runs with a range of convergence tolerances stop, and how far their mixing layer thickness
+and field norms are from those of a run to tEnd.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.runSettings import runSettings
+
+from kelvinHelmholtz import initialConditions, eulerSolver
+
+def runCase(simulation, spacing):
+    '''
+    Run the Kelvin-Helmholtz case until simulation ends the run.
+    
+    Returns
+    thickness: Mixing layer thickness (see diagnostics) at the end of the run
+    norms:     Norms of rho, u and tracer at the end of the run
+    elapsed:   Wall-clock time (s) of the solver loop
+    '''
+    mesh = cubeMesh2D(xPeriodic=True, dx=spacing, dz=spacing)
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    
+    u, rho, tracer = initialConditions(mesh)
+    state = [rho, u, tracer]
+    step = eulerSolver(fvc, g, state)
+    
+    timeInit = time.time()
+    while simulation.updateTime():
+        step(simulation.dt)
+        simulation.checkConvergence(state, mesh)
+    elapsed = time.time() - timeInit
+    
+    c = np.clip((tracer - 0.001)/0.998, 0., 1.)
+    thickness = 4.*np.sum(c*(1. - c))*mesh.dz/mesh.xNCells
+    norms = np.array([np.linalg.norm(field) for field in state])
+    
+    return thickness, norms, elapsed
+
+def main(tolerances=[3e-2, 1e-2, 3e-3], spacing=200., dt=0.1, tEnd=5000., window=500):
+    print "Running to tEnd={}s".format(tEnd)
+    reference, referenceNorms, referenceElapsed = runCase(runSettings(dt=dt, tEnd=tEnd), spacing)
+    
+    print "\n{:>10} {:>10} {:>10} {:>12} {:>12} {:>10}".format("tolerance", "stop (s)", "steps", "thickness", "norm change", "time (s)")
+    print "{:>10} {:>10} {:>10} {:>12.1f} {:>12} {:>10.1f}".format("-", tEnd, int(round(tEnd/dt)), reference, "-", referenceElapsed)
+    for tolerance in tolerances:
+        simulation = runSettings(dt=dt, tEnd=tEnd, convergenceWindow=window, convergenceTolerance=tolerance)
+        thickness, norms, elapsed = runCase(simulation, spacing)
+        
+        # Largest relative difference from the norms of the run to tEnd
+        normChange = np.max(np.abs(norms - referenceNorms)/referenceNorms)
+        print "{:>10} {:>10.1f} {:>10} {:>12.1f} {:>12.2e} {:>10.1f}".format(
+            tolerance, simulation.currentTime, simulation.currentTimeIndex, thickness, normChange, elapsed
+        )
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
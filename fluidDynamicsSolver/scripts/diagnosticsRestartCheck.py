@@ -0,0 +1,102 @@
+'''
+Check of the diagnostics of a restarted run: the Kelvin-Helmholtz test case is checkpointed,
+killed some steps later without closing its diagnostics, then restarted from the checkpoint and
+run to the end. Every diagnostics column must match that of an uninterrupted run bit for bit.
+Exits with an error otherwise.
+'''
+import os
+import sys
+import time
+import shutil
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.folders import folders
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.runSettings import runSettings
+from src.objects.checkpoint import checkpoint
+from src.objects.diagnostics import diagnostics, readDiagnostics
+
+from kelvinHelmholtz import initialConditions, eulerSolver, R, T
+
+soundSpeed = np.sqrt(R*T)
+
+def run(mesh, path, checkpoints, tEnd, stopIndex=None, restart=False):
+    "Run with diagnostics until tEnd, or until step stopIndex without closing the diagnostics"
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    
+    u, rho, tracer = initialConditions(mesh)
+    state = [rho, u, tracer]
+    
+    step = eulerSolver(fvc, g, state)
+    simulation = runSettings(dt=0.01, tEnd=tEnd, adaptive=True)
+    
+    monitor = diagnostics(fvc, path, probes=[(0., 5e3)], append=restart)
+    checkpoints.attach(monitor)
+    
+    if restart:
+        checkpoints.restore(mesh, simulation, state)
+        monitor.truncate(simulation.currentTime)
+    else:
+        monitor.record(simulation.currentTime, rho, u, tracer)
+        simulation.adjustTimestep(u, mesh, soundSpeed)
+    
+    while simulation.updateTime():
+        step(simulation.dt)
+        monitor.record(simulation.currentTime, rho, u, tracer)
+        simulation.adjustTimestep(u, mesh, soundSpeed)
+        
+        if checkpoints.due(simulation):
+            checkpoints.save(mesh, simulation, state)
+        
+        if simulation.currentTimeIndex == stopIndex:
+            # Killed, the buffered diagnostics are lost
+            return
+    
+    monitor.close()
+
+def main(tEnd=50., stepInterval=40, stopIndex=60):
+    folder = folders( folderScripts=os.path.dirname(os.path.realpath(__file__)) )
+    paths = [os.path.join(folder.outputs, name) for name in ["restartCheckpoint", "restartDiagnostics", "uninterruptedDiagnostics"]]
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+    checkpointPath, restartedPath, uninterruptedPath = paths
+    
+    # Checkpointed every stepInterval steps and killed at stopIndex, then restarted without
+    # checkpoints, and run uninterrupted
+    checkpoints = checkpoint(checkpointPath, stepInterval=stepInterval, names=["rho", "u", "tracer"])
+    run(cubeMesh2D(xPeriodic=True), restartedPath, checkpoints, tEnd, stopIndex=stopIndex)
+    checkpoints = checkpoint(checkpointPath)
+    run(checkpoints.mesh(), restartedPath, checkpoints, tEnd, restart=True)
+    run(cubeMesh2D(xPeriodic=True), uninterruptedPath, checkpoint(checkpointPath), tEnd)
+    
+    restarted = readDiagnostics(restartedPath)
+    uninterrupted = readDiagnostics(uninterruptedPath)
+    
+    print "{:>20} {:>10} {:>14} {:>12}".format("column", "records", "uninterrupted", "difference")
+    passed = True
+    for name in sorted(uninterrupted.keys()):
+        if len(restarted[name]) == len(uninterrupted[name]):
+            difference = np.abs(restarted[name] - uninterrupted[name]).max()
+        else:
+            difference = np.inf
+        print "{:>20} {:>10} {:>14} {:>12.3e}".format(name, len(restarted[name]), len(uninterrupted[name]), difference)
+        passed = passed and difference == 0.
+    
+    if not passed:
+        sys.exit("The diagnostics of the restarted run differ from the uninterrupted run")
+    print "\nThe diagnostics of the restarted and uninterrupted runs match"
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
@@ -0,0 +1,97 @@
+'''
+Checks that the Kelvin-Helmholtz case run on a domainDecomposition matches the serial
+solver exactly, for periodic and walled boundaries, and measures the speedup with the
+number of worker processes on a large mesh.
+'''
+import os
+import sys
+import time
+import multiprocessing
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.timeIntegrator import timeIntegrator
+from src.objects.domainDecomposition import domainDecomposition
+
+from kelvinHelmholtz import initialConditions, rightHandSide, boundaryConditions, partitionedSolver
+
+def runCase(mesh, nDomains, scheme, dt, steps):
+    '''
+    Run the Kelvin-Helmholtz case for a number of timesteps, serially when nDomains is 0.
+    
+    Returns
+    state:   Fields [rho, u, tracer] after the last timestep
+    elapsed: Wall-clock time (s) of the solver loop
+    '''
+    g = mesh.volVectorField.copy(order="K")
+    u, rho, tracer = initialConditions(mesh)
+    state = [rho, u, tracer]
+    
+    if nDomains == 0:
+        fvc = finiteVolumeFunctions(mesh)
+        integrator = timeIntegrator(
+            state, rightHandSide(fvc, g, state), scheme=scheme,
+            boundaryConditions=boundaryConditions(fvc)
+        )
+        
+        timeInit = time.time()
+        for i in xrange(steps):
+            integrator.step(state, dt)
+        elapsed = time.time() - timeInit
+    else:
+        decomposition = domainDecomposition(mesh, nDomains)
+        decomposition.start(state, partitionedSolver(g, scheme))
+        
+        timeInit = time.time()
+        decomposition.run(dt, steps)
+        elapsed = time.time() - timeInit
+        
+        decomposition.gather(state)
+        decomposition.stop()
+    
+    return state, elapsed
+
+def main(scheme="sspRK3", dt=0.01, steps=20, largeCells=1200, nProcesses=None):
+    if nProcesses is None:
+        nProcesses = multiprocessing.cpu_count()
+    
+    print "Maximum difference from the serial solver"
+    for xPeriodic, zPeriodic in [(True, False), (True, True), (False, False)]:
+        mesh = cubeMesh2D(xPeriodic=xPeriodic, zPeriodic=zPeriodic)
+        serial, elapsed = runCase(mesh, 0, scheme, dt, steps)
+        
+        for nDomains in [1, 2, 3, 7]:
+            state, elapsed = runCase(mesh, nDomains, scheme, dt, steps)
+            difference = max(np.abs(field-fieldSerial).max() for field, fieldSerial in zip(state, serial))
+            print "xPeriodic={:<6} zPeriodic={:<6} domains={:<3} {:.1e}".format(
+                xPeriodic, zPeriodic, nDomains, difference
+            )
+    
+    mesh = cubeMesh2D(
+        xmin=0., xmax=largeCells*1e1, dx=1e1, xPeriodic=True,
+        zmin=0., zmax=largeCells*1e1, dz=1e1
+    )
+    print "\nSpeedup on a {}x{} mesh, {} timesteps of {}".format(mesh.zNCells, mesh.xNCells, steps, scheme)
+    print "{:>10} {:>10} {:>10}".format("processes", "time (s)", "speedup")
+    
+    state, serialElapsed = runCase(mesh, 0, scheme, dt, steps)
+    print "{:>10} {:>10.2f} {:>10.2f}".format("serial", serialElapsed, 1.)
+    
+    nDomains = 1
+    while nDomains <= nProcesses:
+        state, elapsed = runCase(mesh, nDomains, scheme, dt, steps)
+        print "{:>10} {:>10.2f} {:>10.2f}".format(nDomains, elapsed, serialElapsed/elapsed)
+        nDomains *= 2
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
@@ -11,81 +11,376 @@ import numpy as np
 sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
 from src.objects.folders import folders
 from src.objects.cubeMesh2D import cubeMesh2D
-from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions, tvdLimiters
 from src.objects.runSettings import runSettings
-from src.plots.plotContour import plotContour
+from src.objects.timeIntegrator import timeIntegrator
+from src.objects.pressureProjection import pressureProjection
+from src.objects.domainDecomposition import domainDecomposition
+from src.objects.snapshotWriter import snapshotWriter
+from src.objects.checkpoint import checkpoint
+from src.objects.diagnostics import diagnostics
+from src.plots.plotContour import plotContour, closeRasterFigures
 from src.utilities.makeGif import makeGif
 from src.utilities.fieldOperations import *
 
+# Constants
+T = 300
+R = 8.31
+
+def initialConditions(mesh, shearVelocity=10., perturbation=200.):
+    '''
+    Velocity, density and tracer fields for a shear layer with a perturbed interface.
+    The interface is at 51% of the height of the mesh, lowered by perturbation (m) over the middle
+    half of its width.
+    Fields are stored with a halo of ghost cells, so the operators can use slices instead of copies.
+    On an ensemble mesh shearVelocity and perturbation may hold one value per member.
+    '''
+    # Cells above the interface of each member
+    height = mesh.zmin + 0.51*(mesh.zmax-mesh.zmin)
+    middle = np.abs(mesh.x - 0.5*(mesh.xmin+mesh.xmax)) < 0.25*(mesh.xmax-mesh.xmin)
+    perturbation = np.broadcast_to(perturbation, mesh.ensembleShape)[...,None,None]
+    upper = mesh.z > height - perturbation*middle
+    
+    # Velocity field
+    u = mesh.interior(mesh.haloVectorField.copy(order="K"))
+    shearVelocity = np.broadcast_to(shearVelocity, mesh.ensembleShape)
+    for member in np.ndindex(*mesh.ensembleShape):
+        u[member] += shearVelocity[member]
+        u[member][upper[member]] = -shearVelocity[member]
+    
+    # Density field
+    rho = mesh.interior(mesh.haloScalarField.copy())
+    rho += 1
+    
+    tracer = mesh.interior(mesh.haloScalarField.copy())
+    tracer += 0.999
+    tracer[upper] = 0.001
+    
+    return u, rho, tracer
+
+def eulerSolver(fvc, g, state, subcycles=None, scheme="upwind"):
+    '''
+    Forward Euler update of the continuity, momentum and tracer equations, where each equation
+    uses the fields already updated by the previous one. Returns step(dt), which updates the
+    fields in state = [rho, u, tracer] in place.
+    If given, subcycles(dt) is the number of equal substeps of dt taken by the continuity and
+    momentum equations, e.g. to resolve sound waves, while the tracer is advected once with dt.
+    scheme is the advection scheme, "upwind" or a TVD scheme (see finiteVolumeCalculations.tvdLimiters).
+    '''
+    mesh = fvc.mesh
+    rho, u, tracer = state
+    
+    # Work arrays for the solver loop, so that no arrays are allocated each timestep
+    dtg = mesh.volVectorField.copy(order="K")
+    pressureHalo = mesh.haloScalarField.copy()
+    pressure = mesh.interior(pressureHalo)
+    divRho = mesh.volScalarField.copy()
+    uGradU = mesh.volVectorField.copy(order="K")
+    gradPressure = mesh.volVectorField.copy(order="K")
+    gradTracer = mesh.volVectorField.copy(order="K")
+    uGradTracer = mesh.volScalarField.copy()
+    
+    # Face fluxes and upwind factors of u, shared by the operators and recomputed when u changes
+    flux = fvc.flux(u)
+    
+    def flowStep(dt):
+        np.multiply(g, dt, out=dtg)
+        
+        # pressure = rho*R*T, including the ghost cells (see rightHandSide)
+        np.multiply(mesh.haloOf(rho), R, out=pressureHalo)
+        np.multiply(pressureHalo, T, out=pressureHalo)
+        
+        # Continuity equation, rho = rho - dt*div(rho*u)
+        fvc.div(rho, u, scheme, out=divRho, flux=flux)
+        np.multiply(divRho, dt, out=divRho)
+        rho[...] -= divRho
+        fvc.setBoundaryConditions(rho)
+        
+        # Momentum equation, u = u - dt*(u.grad)u + dt*g - dt*grad(p)/rho
+        fvc.uDotGradU(u, scheme, out=uGradU, flux=flux)
+        np.multiply(uGradU, dt, out=uGradU)
+        u[...] -= uGradU
+        u[...] += dtg
+        fvc.grad(pressure, "linear", out=gradPressure)
+        np.multiply(gradPressure, dt, out=gradPressure)
+        np.divide(gradPressure, rho[...,None], out=gradPressure)
+        u[...] -= gradPressure
+        fvc.setBoundaryConditions(u)
+    
+    def tracerStep(dt):
+        # Advection of tracers which follow the flow, tracer = tracer - dt*u.grad(tracer)
+        fvc.grad(tracer, scheme, u=u, out=gradTracer, flux=flux)
+        dot(u, gradTracer, out=uGradTracer)
+        np.multiply(uGradTracer, dt, out=uGradTracer)
+        tracer[...] -= uGradTracer
+    
+    def step(dt):
+        nSubcycles = 1 if subcycles is None else subcycles(dt)
+        for subcycle in xrange(nSubcycles):
+            flowStep(dt/nSubcycles)
+        tracerStep(dt)
+    
+    return step
+
+def incompressibleSolver(fvc, g, state):
+    '''
+    Chorin projection update for incompressible flow at constant density: advance the momentum
+    equation without the pressure gradient, then project the velocity to be divergence free. 
+    There are no sound waves, so the timestep is limited only by the advective velocity.
+    Returns step(dt), which updates the fields in state = [rho, u, tracer] in place.
+    '''
+    mesh = fvc.mesh
+    rho, u, tracer = state
+    
+    dtg = mesh.volVectorField.copy(order="K")
+    uGradU = mesh.volVectorField.copy(order="K")
+    gradTracer = mesh.volVectorField.copy(order="K")
+    uGradTracer = mesh.volScalarField.copy()
+    
+    flux = fvc.flux(u)
+    projection = pressureProjection(fvc)
+    
+    def step(dt):
+        np.multiply(g, dt, out=dtg)
+        
+        # Intermediate velocity, u = u - dt*(u.grad)u + dt*g
+        fvc.uDotGradU(u, "upwind", out=uGradU, flux=flux)
+        np.multiply(uGradU, dt, out=uGradU)
+        u[...] -= uGradU
+        u[...] += dtg
+        
+        # Pressure correction, u = u - dt*grad(p) with div(grad(p)) = div(u)/dt, which also applies
+        # the boundary conditions of u
+        projection.project(u, dt)
+        
+        # Advection of tracers which follow the flow, tracer = tracer - dt*u.grad(tracer)
+        fvc.grad(tracer, "upwind", u=u, out=gradTracer, flux=flux)
+        dot(u, gradTracer, out=uGradTracer)
+        np.multiply(uGradTracer, dt, out=uGradTracer)
+        tracer[...] -= uGradTracer
+    
+    return step
+
+def rightHandSide(fvc, g, state, scheme="upwind"):
+    '''
+    Tendencies of the continuity, momentum and tracer equations for a timeIntegrator, where all
+    equations are evaluated with the fields at the start of the stage.
+    '''
+    mesh = fvc.mesh
+    rho, u, tracer = state
+    
+    pressureHalo = mesh.haloScalarField.copy()
+    pressure = mesh.interior(pressureHalo)
+    gradPressure = mesh.volVectorField.copy(order="K")
+    gradTracer = mesh.volVectorField.copy(order="K")
+    flux = fvc.flux(u)
+    
+    def tendencies(state, tendency):
+        rho, u, tracer = state
+        rhoTendency, uTendency, tracerTendency = tendency
+        
+        # pressure = rho*R*T, including the ghost cells so that halos exchanged between the
+        # sub-domains of a domainDecomposition carry over
+        np.multiply(mesh.haloOf(rho), R, out=pressureHalo)
+        np.multiply(pressureHalo, T, out=pressureHalo)
+        
+        # d(rho)/dt = -div(rho*u)
+        fvc.div(rho, u, scheme, out=rhoTendency, flux=flux)
+        rhoTendency *= -1.
+        
+        # du/dt = -(u.grad)u + g - grad(p)/rho
+        fvc.uDotGradU(u, scheme, out=uTendency, flux=flux)
+        uTendency *= -1.
+        uTendency += g
+        fvc.grad(pressure, "linear", out=gradPressure)
+        np.divide(gradPressure, rho[...,None], out=gradPressure)
+        uTendency -= gradPressure
+        
+        # d(tracer)/dt = -u.grad(tracer)
+        fvc.grad(tracer, scheme, u=u, out=gradTracer, flux=flux)
+        dot(u, gradTracer, out=tracerTendency)
+        tracerTendency *= -1.
+    
+    return tendencies
+
+def boundaryConditions(fvc):
+    def apply(state):
+        rho, u, tracer = state
+        fvc.setBoundaryConditions(rho)
+        fvc.setBoundaryConditions(u)
+    
+    return apply
+
+def partitionedSolver(g, scheme, advectionScheme="upwind"):
+    '''
+    Solver for each sub-domain of a domainDecomposition: a timeIntegrator of rightHandSide, with
+    the halos exchanged between the sub-domains after every stage.
+    The sub-domains exchange one row of ghost cells, so the TVD advection schemes, whose stencils
+    reach two rows, are not supported.
+    '''
+    if advectionScheme in tvdLimiters:
+        raise ValueError("The {} scheme needs two halo rows, a domainDecomposition exchanges one".format(advectionScheme))
+    
+    def solver(mesh, state, exchange, rows):
+        fvc = finiteVolumeFunctions(mesh)
+        applyBoundaryConditions = boundaryConditions(fvc)
+        
+        def applyAndExchange(state):
+            applyBoundaryConditions(state)
+            exchange()
+        
+        integrator = timeIntegrator(
+            state, rightHandSide(fvc, g[rows], state, advectionScheme), scheme=scheme, 
+            boundaryConditions=applyAndExchange
+        )
+        return lambda dt: integrator.step(state, dt)
+    
+    return solver
+
 def main():
     # Fetch folders for code structure
     folder = folders( folderScripts=os.path.dirname(os.path.realpath(__file__)) )
     
+    # Checkpoints of the run, saved every [stepInterval] steps or [wallInterval] seconds of wall-clock
+    # time (0 disables either). With restart=True the run resumes from the last checkpoint, with the
+    # mesh and fields of the checkpoint and the end time, output intervals and solver settings below.
+    restart = False
+    checkpoints = checkpoint(
+        os.path.join(folder.outputs, "kelvinHelmholtzCheckpoint"), stepInterval=0, wallInterval=600.,
+        names=["rho", "u", "tracer"]
+    )
+    
     # Import the mesh for the fluid solver
     mesh = cubeMesh2D(xPeriodic=True)
+    if restart:
+        mesh = checkpoints.mesh()
     x = mesh.x
     z = mesh.z
-
-    # Import finite volume operations using mesh geometry
-    fvc = finiteVolumeFunctions(mesh)
-
+    
+    # Import finite volume operations using mesh geometry. With threads, grad, div and laplacian are
+    # evaluated in cache-sized blocks of rows on that many threads (for meshes of ~1000x1000 or more)
+    threads = None
+    fvc = finiteVolumeFunctions(mesh, threads=threads)
+    
     # Initialise the simulation
     simulation = runSettings(
         dt=0.01,                 # Timestep for simulation
         tEnd=1000,              # End time (s) of simulation
-        plotInterval=10.        # Plot every [plotInterval] seconds
+        plotInterval=10.,       # Plot every [plotInterval] seconds
+        writeInterval=10.,      # Write the fields every [writeInterval] seconds (0 to disable)
+        adaptive=False,         # Adapt dt to the Courant number (dt above is then the initial timestep)
+        targetCourant=0.5,      # Courant number for adaptive timestepping
+        convergenceWindow=0,    # Stop early once the fields change little over [convergenceWindow] steps (0 to disable)
+        convergenceTolerance=1e-4 # Relative change in the norms of rho, u and tracer below which the run has converged
     )
-
-
     
-
+    # Time integration: "euler" for the sequential forward Euler update, or a timeIntegrator 
+    # scheme ("sspRK2", "sspRK3", "lowStorageRK4") which allows larger timesteps
+    timeScheme = "euler"
+    
+    # Advection scheme: first order "upwind", or a second order TVD scheme ("minmod", "vanLeer",
+    # "superbee", "MUSCL") which keeps the interface sharp on coarser meshes
+    advectionScheme = "upwind"
+    
+    # "compressible" ideal gas, or "incompressible" Chorin projection (constant density, forward Euler)
+    # which removes the acoustic timestep limit
+    mode = "compressible"
+    
+    # Number of worker processes for the timeIntegrator schemes, each advancing a strip of rows
+    # (the "euler" scheme then uses timeIntegrator's forward Euler step; upwind advection only)
+    nDomains = 1
+    
+    # Subcycle the continuity and momentum equations at the acoustic Courant limit, while the tracer
+    # and plotting advance at the (larger) advective limit. For the "euler" scheme, with adaptive=True
+    multirate = False
+    
+    
+    
+    
     # Constants
-    T = 300
-    R = 8.31
-    g = mesh.volVectorField.copy()
+    g = mesh.volVectorField.copy(order="K")
     # g[:,:,1] = -9.81
     
     
     '''
     INITIAL CONDITIONS
     '''
-    # Velocity field
-    u = mesh.volVectorField.copy()
-    u += 10.
-    u[:49,:] = -10.
-    u[:51,50:150] = -10.
-
-    # Density field
-    rho = 0*mesh.volScalarField.copy() + 1
-
-    tracer = mesh.volScalarField.copy()
-    tracer += 0.999
-    tracer[:49,:] = 0.001
-    tracer[:51,50:150] = 0.001
+    u, rho, tracer = initialConditions(mesh)
+    state = [rho, u, tracer]
+    if restart:
+        checkpoints.restore(mesh, simulation, state)
     
     
-    dt = simulation.dt
-
-    # Plot initial conditions
-    plotContour(x, z, tracer, "kelvinHelmholtz_0.png", folder=folder.outputs)
+    # Isothermal sound speed, limits the timestep for adaptive timestepping
+    soundSpeed = np.sqrt(R*T)
+    
+    # Sound speed for the Courant number of the outer timestep
+    timestepSoundSpeed = soundSpeed
+    
+    if mode == "incompressible":
+        soundSpeed = 0.
+        timestepSoundSpeed = 0.
+        step = incompressibleSolver(fvc, g, state)
+    elif nDomains > 1:
+        decomposition = domainDecomposition(mesh, nDomains)
+        decomposition.start(state, partitionedSolver(g, timeScheme, advectionScheme))
+        
+        def step(dt):
+            decomposition.run(dt)
+            decomposition.gather(state)
+    elif timeScheme == "euler":
+        subcycles = None
+        if multirate:
+            subcycles = lambda dt: simulation.subcycles(simulation.courantRate(u, mesh, soundSpeed), dt)
+            timestepSoundSpeed = 0.
+        step = eulerSolver(fvc, g, state, subcycles, advectionScheme)
+    else:
+        integrator = timeIntegrator(
+            state, rightHandSide(fvc, g, state, advectionScheme), scheme=timeScheme, 
+            boundaryConditions=boundaryConditions(fvc)
+        )
+        step = lambda dt: integrator.step(state, dt)
+    
+    # Snapshots are written in the background, see plotSnapshots.py to plot them afterwards
+    writer = snapshotWriter(os.path.join(folder.outputs, "kelvinHelmholtz"), ["rho", "u", "tracer"], append=restart)
+    
+    # Diagnostics and probes every step, see readDiagnostics. With a saturationColumn (e.g.
+    # "mixingThickness") the run stops once it no longer changes; None runs to tEnd.
+    monitor = diagnostics(
+        fvc, os.path.join(folder.outputs, "kelvinHelmholtzDiagnostics"), probes=[(0., 5e3), (5e3, 5e3)],
+        saturationColumn=None, append=restart
+    )
+    
+    # Both are flushed with every checkpoint, so a restart finds them complete up to it
+    checkpoints.attach(writer)
+    checkpoints.attach(monitor)
+    
+    if restart:
+        # Drop what was written between the checkpoint and the end of the previous run
+        writer.truncate(simulation.currentTime)
+        monitor.truncate(simulation.currentTime)
+    else:
+        monitor.record(simulation.currentTime, rho, u, tracer)
+        
+        # Plot initial conditions
+        plotContour(x, z, tracer, "kelvinHelmholtz_0.png", folder=folder.outputs)
+        writer.write(simulation.currentTime, state)
+        
+        # A restored run already has the timestep for its next step
+        simulation.adjustTimestep(u, mesh, timestepSoundSpeed)
     
     # Run simulation until end time is reached
     while simulation.updateTime():
         sys.stdout.write("\rRunning simulation, t={}s".format(simulation.currentTime))
         sys.stdout.flush()
         
-        pressure = rho*R*T
-        
-        # Continuity equation
-        rho = rho - dt*fvc.div(rho, u, "upwind")
-        rho = fvc.setBoundaryConditions(rho)
-        
-        # Momentum equation
-        u = u - dt*fvc.uDotGradU(u, "upwind") + dt*g - dt*fvc.grad(pressure, "linear")/rho[:,:,None]
-        u = fvc.setBoundaryConditions(u)
+        step(simulation.dt)
+        simulation.checkConvergence(state, mesh)
         
-        # Advection of tracers which follow the flow
-        tracer = tracer - dt*dot(u, fvc.grad(tracer, "upwind", u=u))
+        monitor.record(simulation.currentTime, rho, u, tracer)
+        if monitor.saturated():
+            print "\nStopping at t={}s, {} has saturated".format(simulation.currentTime, monitor.saturationColumn)
+            break
         
         if simulation.plotFigures():
             print "\nPlotting profiles at t={}s".format(simulation.currentTime)
@@ -95,6 +390,21 @@ def main():
             
             # plotContour(x, z, rho, fileId, vmin=0.5, folder=folder.outputs)
             # plotContour(x, z, u[:,:,0], fileId, vmin=0., vmax=15., folder=folder.outputs)
+        
+        if simulation.writeData():
+            writer.write(simulation.currentTime, state)
+        
+        simulation.adjustTimestep(u, mesh, timestepSoundSpeed)
+        
+        if checkpoints.due(simulation):
+            checkpoints.save(mesh, simulation, state)
+    
+    writer.close()
+    monitor.close()
+    closeRasterFigures()
+    
+    if simulation.converged:
+        print "\nConverged at t={}s, relative changes {}".format(simulation.currentTime, simulation.residuals)
 
 
 
@@ -0,0 +1,85 @@
+'''
+Ensemble of Kelvin-Helmholtz runs with different shear velocities and interface perturbations,
+advanced together on a mesh with a leading ensemble axis and, for comparison, one member at a
+time. Reports the wall-clock time of both and the largest difference between their fields at
+the end time.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.timeIntegrator import timeIntegrator
+
+from kelvinHelmholtz import initialConditions, eulerSolver, incompressibleSolver, rightHandSide, boundaryConditions
+
+def runCase(solver, shearVelocity, perturbation, ensembleSize, dt, tEnd):
+    '''
+    Run the Kelvin-Helmholtz case to tEnd with a fixed timestep.
+    
+    Returns
+    state:   Fields [rho, u, tracer] at tEnd
+    elapsed: Wall-clock time (s) of the solver loop
+    '''
+    mesh = cubeMesh2D(xPeriodic=True, ensembleSize=ensembleSize)
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    
+    u, rho, tracer = initialConditions(mesh, shearVelocity, perturbation)
+    state = [rho, u, tracer]
+    
+    if solver == "euler":
+        step = eulerSolver(fvc, g, state)
+    elif solver == "incompressible":
+        step = incompressibleSolver(fvc, g, state)
+    else:
+        integrator = timeIntegrator(
+            state, rightHandSide(fvc, g, state), scheme=solver,
+            boundaryConditions=boundaryConditions(fvc)
+        )
+        step = lambda dt: integrator.step(state, dt)
+    
+    timeInit = time.time()
+    for i in xrange(int(round(tEnd/dt))):
+        step(dt)
+    elapsed = time.time() - timeInit
+    
+    return state, elapsed
+
+def main(ensembleSize=8, dt=0.01, tEnd=2.):
+    shearVelocities = np.linspace(8., 12., ensembleSize)
+    perturbations = np.linspace(100., 300., ensembleSize)
+    
+    print "{:>15} {:>10} {:>14} {:>12} {:>8} {:>10}".format(
+        "solver", "members", "one by one (s)", "ensemble (s)", "speedup", "max diff"
+    )
+    
+    for solver in ["euler", "sspRK3", "incompressible"]:
+        ensembleState, ensembleElapsed = runCase(solver, shearVelocities, perturbations, ensembleSize, dt, tEnd)
+        
+        elapsed = 0.
+        difference = 0.
+        for member, (shearVelocity, perturbation) in enumerate(zip(shearVelocities, perturbations)):
+            state, memberElapsed = runCase(solver, shearVelocity, perturbation, None, dt, tEnd)
+            elapsed += memberElapsed
+            difference = max(
+                [difference] + [np.abs(ensembleField[member]-field).max() for ensembleField, field in zip(ensembleState, state)]
+            )
+        
+        print "{:>15} {:>10} {:>14.2f} {:>12.2f} {:>8.2f} {:>10.1e}".format(
+            solver, ensembleSize, elapsed, ensembleElapsed, elapsed/ensembleElapsed, difference
+        )
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
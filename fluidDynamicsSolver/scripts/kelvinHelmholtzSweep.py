@@ -0,0 +1,103 @@
+'''
+Sweep of the Kelvin-Helmholtz case over the shear velocity, interface perturbation, mesh spacing,
+timestep and advection scheme, run in parallel with parameterSweep. Results are cached under
+outputs/kelvinHelmholtzSweep by a hash of the parameters and of the source code, so rerunning the
+script only runs the cases which are new, did not finish or ran an older version of the code.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.folders import folders
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.parameterSweep import parameterSweep, sourceVersion
+
+from kelvinHelmholtz import initialConditions, eulerSolver
+
+def kelvinHelmholtzCase(shearVelocity, perturbation, spacing, dt, scheme, tEnd):
+    '''
+    Run the Kelvin-Helmholtz case with the forward Euler solver to tEnd with a fixed timestep.
+    
+    Returns the fields at tEnd, the mixing layer thickness (see diagnostics) every second and the
+    wall-clock time of the solver loop.
+    '''
+    mesh = cubeMesh2D(xPeriodic=True, dx=spacing, dz=spacing)
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    
+    u, rho, tracer = initialConditions(mesh, shearVelocity, perturbation)
+    step = eulerSolver(fvc, g, [rho, u, tracer], scheme=scheme)
+    
+    def mixingThickness():
+        c = np.clip((tracer - 0.001)/0.998, 0., 1.)
+        return 4.*np.sum(c*(1. - c))*mesh.dz/mesh.xNCells
+    
+    stepsPerSecond = int(round(1./dt))
+    thickness = [mixingThickness()]
+    
+    timeInit = time.time()
+    for i in xrange(1, int(round(tEnd/dt))+1):
+        step(dt)
+        if i % stepsPerSecond == 0:
+            thickness.append(mixingThickness())
+    elapsed = time.time() - timeInit
+    
+    return {"rho": rho, "u": u, "tracer": tracer, "mixingThickness": np.array(thickness), "elapsed": elapsed}
+
+def main(
+        grid=[
+            {
+                "shearVelocity": [5., 10.],
+                "perturbation": [100., 200.],
+                "spacing": [100.],
+                "dt": [0.05],
+                "scheme": ["upwind", "vanLeer"],
+                "tEnd": [100.]
+            },
+            {
+                # Both perturbations move the interface across the same cell at this spacing
+                "shearVelocity": [5., 10.],
+                "perturbation": [200.],
+                "spacing": [200.],
+                "dt": [0.05],
+                "scheme": ["upwind", "vanLeer"],
+                "tEnd": [100.]
+            }
+        ],
+        workers=None,
+        memoryBudget=2**30
+    ):
+    folder = folders( folderScripts=os.path.dirname(os.path.realpath(__file__)) )
+    
+    # Cached runs are repeated once this script, the Kelvin-Helmholtz case or the solver change
+    version = sourceVersion([
+        os.path.join(folder.scripts, "kelvinHelmholtzSweep.py"), os.path.join(folder.scripts, "kelvinHelmholtz.py"),
+        folder.src
+    ])
+    
+    sweep = parameterSweep(
+        os.path.join(folder.outputs, "kelvinHelmholtzSweep"), kelvinHelmholtzCase, version=version,
+        workers=workers, memoryBudget=memoryBudget
+    )
+    results = sweep.run(grid)
+    
+    print "\n{:>6} {:>8} {:>8} {:>6} {:>8} {:>10} {:>10}".format("shear", "perturb", "dx (m)", "dt", "scheme", "thickness", "time (s)")
+    for parameters, result in results:
+        print "{:>6} {:>8} {:>8} {:>6} {:>8} {:>10.1f} {:>10.1f}".format(
+            parameters["shearVelocity"], parameters["perturbation"], parameters["spacing"], parameters["dt"],
+            parameters["scheme"], result["mixingThickness"][-1], float(result["elapsed"])
+        )
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
@@ -0,0 +1,87 @@
+'''
+Kelvin-Helmholtz test case with adaptive timestepping, run with every equation at the acoustic
+Courant limit and with the multi-rate forward Euler solver, where the continuity and momentum
+equations subcycle at the acoustic limit and the tracer advances at the advective limit.
+Reports the number of steps, wall-clock time and the difference between the two runs.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.runSettings import runSettings
+
+from kelvinHelmholtz import initialConditions, eulerSolver, R, T
+
+def runCase(multirate, tEnd, targetCourant):
+    '''
+    Run the Kelvin-Helmholtz case to tEnd with adaptive timestepping.
+    
+    Returns
+    state:     Fields [rho, u, tracer] at tEnd
+    steps:     Number of (tracer) timesteps
+    subcycles: Number of continuity/momentum updates
+    elapsed:   Wall-clock time (s) of the solver loop
+    '''
+    mesh = cubeMesh2D(xPeriodic=True)
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    
+    u, rho, tracer = initialConditions(mesh)
+    state = [rho, u, tracer]
+    
+    simulation = runSettings(dt=0.01, tEnd=tEnd, adaptive=True, targetCourant=targetCourant)
+    soundSpeed = np.sqrt(R*T)
+    timestepSoundSpeed = soundSpeed
+    
+    counts = []
+    def subcycles(dt):
+        counts.append(simulation.subcycles(simulation.courantRate(u, mesh, soundSpeed), dt))
+        return counts[-1]
+    
+    if multirate:
+        step = eulerSolver(fvc, g, state, subcycles)
+        timestepSoundSpeed = 0.
+    else:
+        step = eulerSolver(fvc, g, state)
+    
+    steps = 0
+    timeInit = time.time()
+    simulation.adjustTimestep(u, mesh, timestepSoundSpeed)
+    while simulation.updateTime():
+        step(simulation.dt)
+        steps += 1
+        simulation.adjustTimestep(u, mesh, timestepSoundSpeed)
+    elapsed = time.time() - timeInit
+    
+    return state, steps, sum(counts) if multirate else steps, elapsed
+
+def main(tEnd=200., targetCourant=0.5):
+    print "{:>12} {:>8} {:>10} {:>10} {:>10} {:>10} {:>12}".format(
+        "solver", "steps", "subcycles", "time (s)", "speedup", "diff rho", "diff tracer"
+    )
+    
+    reference, steps, subcycles, elapsedReference = runCase(False, tEnd, targetCourant)
+    print "{:>12} {:>8} {:>10} {:>10.2f} {:>10.2f} {:>10} {:>12}".format(
+        "single rate", steps, subcycles, elapsedReference, 1., "-", "-"
+    )
+    
+    state, steps, subcycles, elapsed = runCase(True, tEnd, targetCourant)
+    differences = [np.sqrt(np.mean((field - fieldReference)**2)) for field, fieldReference in zip(state, reference)]
+    print "{:>12} {:>8} {:>10} {:>10.2f} {:>10.2f} {:>10.2e} {:>12.2e}".format(
+        "multirate", steps, subcycles, elapsed, elapsedReference/elapsed, differences[0], differences[2]
+    )
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
@@ -0,0 +1,49 @@
+'''
+Time per frame of plotContour for the triangulated tricontourf path and the raster path, which
+draws the field as an image into a figure reused between frames, on rolled-up shear layers
+like the tracer of kelvinHelmholtz.py.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.folders import folders
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.plots.plotContour import plotContour, closeRasterFigures
+
+def frame(mesh, phase):
+    "Tracer of a shear layer rolled up into billows, shifted by phase"
+    k = 2.*np.pi/(mesh.xmax-mesh.xmin)
+    height = 5e3 + 1.5e3*np.sin(2.*k*mesh.x + phase)*np.exp(-((mesh.z-5e3)/2e3)**2)
+    return 0.5 + 0.5*np.tanh((mesh.z - height + 300.*np.sin(8.*k*mesh.x - 3.*phase))/200.)
+
+def main(nFrames=10, resolutions=[100., 50.]):
+    folder = folders( folderScripts=os.path.dirname(os.path.realpath(__file__)) )
+    
+    print "{:>10} {:>12} {:>12} {:>8}".format("cells", "tricontourf", "raster", "gain")
+    for dx in resolutions:
+        mesh = cubeMesh2D(dx=dx, dz=dx, xPeriodic=True)
+        
+        timings = []
+        for raster in [False, True]:
+            timeInit = time.time()
+            for index in xrange(nFrames):
+                fileId = "benchmark_{}_{}.png".format("raster" if raster else "tricontourf", index)
+                plotContour(mesh.x, mesh.z, frame(mesh, 0.3*index), fileId, folder=folder.outputs, raster=raster)
+            timings.append((time.time()-timeInit)/nFrames)
+        closeRasterFigures()
+        
+        print "{:>10} {:>11.3f}s {:>11.3f}s {:>8.1f}".format(mesh.x.size, timings[0], timings[1], timings[0]/timings[1])
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
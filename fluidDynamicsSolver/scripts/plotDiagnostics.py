@@ -0,0 +1,40 @@
+'''
+Plot the time series of diagnostics written by kelvinHelmholtz.py (see diagnostics) without
+rerunning the simulation, one figure per column against time.
+'''
+import os
+import sys
+import time
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.folders import folders
+from src.objects.diagnostics import readDiagnostics
+
+def main(names=["kineticEnergy", "enstrophy", "massError", "mixingThickness", "probe0_uz"]):
+    folder = folders( folderScripts=os.path.dirname(os.path.realpath(__file__)) )
+    
+    columns = readDiagnostics(os.path.join(folder.outputs, "kelvinHelmholtzDiagnostics"))
+    print "Read {} records up to t={}s".format(len(columns["time"]), columns["time"][-1])
+    
+    for name in names:
+        fig = plt.figure()
+        plt.plot(columns["time"], columns[name])
+        plt.xlabel("Time (s)")
+        plt.ylabel(name)
+        fig.tight_layout()
+        plt.savefig(os.path.join(folder.outputs, "diagnostics_{}.png".format(name)), dpi=200.)
+        plt.close()
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
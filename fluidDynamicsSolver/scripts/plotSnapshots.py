@@ -0,0 +1,45 @@
+'''
+Plot the snapshots written by kelvinHelmholtz.py (see snapshotWriter) without rerunning the
+simulation. Each snapshot of the chosen field is read from the store as it is plotted.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.folders import folders
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.snapshotWriter import readSnapshots
+from src.plots.plotContour import plotContour, closeRasterFigures
+
+def main(name="tracer", component=0, vmin=0., vmax=1.):
+    folder = folders( folderScripts=os.path.dirname(os.path.realpath(__file__)) )
+    
+    # Mesh of the simulation, for the cell coordinates
+    mesh = cubeMesh2D(xPeriodic=True)
+    
+    times, fields = readSnapshots(os.path.join(folder.outputs, "kelvinHelmholtz"))
+    field = fields[name]
+    
+    for index, snapshotTime in enumerate(times):
+        print "Plotting {} at t={}s".format(name, snapshotTime)
+        values = field[index]
+        if values.ndim == 3:
+            values = values[...,component]
+        
+        fileId = "snapshot_{}_{}.png".format(name, index)
+        plotContour(mesh.x, mesh.z, np.asarray(values), fileId, vmin=vmin, vmax=vmax, folder=folder.outputs)
+    
+    closeRasterFigures()
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
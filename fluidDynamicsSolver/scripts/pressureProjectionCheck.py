@@ -0,0 +1,65 @@
+'''
+Check of pressureProjection: the divergence div(1, u, "linear") of the Kelvin-Helmholtz initial
+velocity, with a smooth vertical perturbation, before and after one projection on a range of
+meshes. The projection must reduce its RMS by at least the given factor. Exits with an error
+otherwise.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.pressureProjection import pressureProjection
+
+from kelvinHelmholtz import initialConditions
+
+def divergence(fvc, u):
+    "RMS and maximum of the divergence of u"
+    ones = fvc.mesh.interior(fvc.mesh.haloScalarField.copy())
+    ones += 1.
+    divergenceField = fvc.div(ones, u, "linear")
+    
+    return np.sqrt(np.mean(divergenceField**2)), np.max(np.abs(divergenceField))
+
+def main(dt=0.01, reduction=1e-8):
+    meshes = [
+        ("default", {"xPeriodic": True}),
+        ("x walls", {}),
+        ("odd cells", {"xPeriodic": True, "dx": 130., "dz": 90.}),
+        ("component major", {"xPeriodic": True, "componentMajor": True}),
+        ("ensemble", {"xPeriodic": True, "ensembleSize": 3})
+    ]
+    
+    print "{:>16} {:>12} {:>12} {:>12} {:>12}".format("mesh", "rms before", "max before", "rms after", "max after")
+    
+    passed = True
+    for name, arguments in meshes:
+        mesh = cubeMesh2D(**arguments)
+        fvc = finiteVolumeFunctions(mesh)
+        u, rho, tracer = initialConditions(mesh)
+        u[...,1] += 0.3*np.sin(mesh.x/700.)*np.cos(mesh.z/900.)
+        
+        before = divergence(fvc, u)
+        pressureProjection(fvc).project(u, dt)
+        after = divergence(fvc, u)
+        
+        print "{:>16} {:>12.3e} {:>12.3e} {:>12.3e} {:>12.3e}".format(name, before[0], before[1], after[0], after[1])
+        passed = passed and after[0] < reduction*before[0]
+    
+    if not passed:
+        sys.exit("The projection reduced the divergence by less than {}".format(reduction))
+    print "\nThe projection reduced the divergence by more than {}".format(reduction)
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
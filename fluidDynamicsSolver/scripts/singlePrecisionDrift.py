@@ -0,0 +1,85 @@
+'''
+Validation of the single precision (float32) mode on the Kelvin-Helmholtz test case.
+Each solver is run on a float32 and a float64 mesh, and the relative RMS difference of
+every field at the end time must stay below a bound. Exits with an error otherwise.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.objects.timeIntegrator import timeIntegrator
+
+from kelvinHelmholtz import initialConditions, eulerSolver, incompressibleSolver, rightHandSide, boundaryConditions
+
+def runCase(solver, dtype, dt, tEnd):
+    '''
+    Run the Kelvin-Helmholtz case to tEnd with a fixed timestep.
+    
+    Returns
+    state:   Fields [rho, u, tracer] at tEnd
+    elapsed: Wall-clock time (s) of the solver loop
+    '''
+    mesh = cubeMesh2D(xPeriodic=True, dtype=dtype)
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    
+    u, rho, tracer = initialConditions(mesh)
+    state = [rho, u, tracer]
+    
+    if solver == "euler":
+        step = eulerSolver(fvc, g, state)
+    elif solver == "incompressible":
+        step = incompressibleSolver(fvc, g, state)
+    else:
+        integrator = timeIntegrator(
+            state, rightHandSide(fvc, g, state), scheme=solver,
+            boundaryConditions=boundaryConditions(fvc)
+        )
+        step = lambda dt: integrator.step(state, dt)
+    
+    timeInit = time.time()
+    for i in xrange(int(round(tEnd/dt))):
+        step(dt)
+    elapsed = time.time() - timeInit
+    
+    return state, elapsed
+
+def main(dt=0.01, tEnd=10., bound=1e-4):
+    print "{:>15} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+        "solver", "float64 (s)", "float32 (s)", "drift rho", "drift u", "drift tracer"
+    )
+    
+    passed = True
+    for solver in ["euler", "sspRK3", "incompressible"]:
+        state64, elapsed64 = runCase(solver, np.float64, dt, tEnd)
+        state32, elapsed32 = runCase(solver, np.float32, dt, tEnd)
+        
+        drifts = []
+        for field64, field32 in zip(state64, state32):
+            assert field32.dtype == np.float32
+            difference = field32.astype(np.float64) - field64
+            drifts.append(np.sqrt(np.mean(difference**2)/np.mean(field64**2)))
+        
+        print "{:>15} {:>12.2f} {:>12.2f} {:>12.2e} {:>12.2e} {:>12.2e}".format(
+            solver, elapsed64, elapsed32, *drifts
+        )
+        passed = passed and max(drifts) < bound
+    
+    if not passed:
+        sys.exit("float32 drift exceeds the bound of {}".format(bound))
+    print "\nfloat32 drift is below the bound of {}".format(bound)
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
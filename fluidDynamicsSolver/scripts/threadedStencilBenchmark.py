@@ -0,0 +1,78 @@
+'''
+Throughput of grad, div and laplacian of finiteVolumeFunctions on the whole mesh and in blocks
+of rows (see finiteVolumeFunctions.rowBlocks) on 1 thread and on a thread per core. Blocks of
+rows keep the working arrays in cache on large meshes, and threads evaluate blocks in parallel.
+All modes give identical results.
+'''
+import os
+import sys
+import time
+import multiprocessing
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+
+def benchmarks(mesh, threads):
+    "Operators to time, as a list of (name, function) where each function returns its result"
+    fvc = finiteVolumeFunctions(mesh, threads=threads)
+    
+    u = mesh.interior(mesh.haloVectorField.copy(order="K"))
+    u[...,0] = 10.*np.sin(mesh.z/1e3)
+    u[...,1] = np.sin(mesh.x/1e3)
+    tracer = mesh.interior(mesh.haloScalarField.copy())
+    tracer[...] = 0.5 + 0.5*np.tanh((mesh.z - 0.5*(mesh.zmin+mesh.zmax))/1e2)
+    
+    flux = fvc.flux(u)
+    gradTracer = mesh.volVectorField.copy(order="K")
+    divTracer = mesh.volScalarField.copy()
+    laplacianTracer = mesh.volScalarField.copy()
+    
+    def grad():
+        return fvc.grad(tracer, "upwind", u=u, out=gradTracer, flux=flux)
+    
+    def div():
+        return fvc.div(tracer, u, "upwind", out=divTracer, flux=flux)
+    
+    def laplacian():
+        return fvc.laplacian(tracer, out=laplacianTracer)
+    
+    return [("grad", grad), ("div", div), ("laplacian", laplacian)]
+
+def main(nCells=[250, 1000, 2000], cells=2e7):
+    cores = multiprocessing.cpu_count()
+    modes = [("whole mesh", None), ("blocks", 1), ("{} threads".format(cores), cores)]
+    
+    for n in nCells:
+        mesh = cubeMesh2D(xmin=0., xmax=n*1e1, dx=1e1, xPeriodic=True, zmin=0., zmax=n*1e1, dz=1e1)
+        repeats = max(3, int(cells/(n*n)))
+        
+        print "\n{}x{} mesh, Mcells/s".format(n, n)
+        print "{:>10} {:>12} {:>12} {:>12} {:>10}".format("operator", *([name for name, threads in modes] + ["max diff"]))
+        
+        functions = [benchmarks(mesh, threads) for name, threads in modes]
+        for operators in zip(*functions):
+            throughput = []
+            results = []
+            for name, function in operators:
+                function()
+                timeInit = time.time()
+                for i in xrange(repeats):
+                    function()
+                throughput.append(repeats*n*n/(time.time()-timeInit)/1e6)
+                results.append(function().copy(order="K"))
+            
+            difference = max(np.abs(result - results[0]).max() for result in results)
+            print "{:>10} {:>12.1f} {:>12.1f} {:>12.1f} {:>10.1e}".format(name, *(throughput + [difference]))
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
@@ -0,0 +1,88 @@
+'''
+Accuracy per cost of the advection schemes on the Kelvin-Helmholtz test case. Each scheme is run
+on a range of mesh sizes and its tracer field compared with a MUSCL reference solution on a
+finer mesh. Reports the error and wall-clock time of every run, and for each scheme the
+coarsest mesh which is at least as accurate as the upwind scheme on the standard 100 m mesh.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+
+from kelvinHelmholtz import initialConditions, eulerSolver
+
+def resample(field, factor):
+    "Average blocks of factor x factor cells (factor > 1), or copy each cell to 1/factor x 1/factor cells"
+    if factor >= 1:
+        factor = int(round(factor))
+        shape = field.shape
+        return field.reshape((shape[0]//factor, factor, shape[1]//factor, factor) + shape[2:]).mean(axis=(1, 3))
+    
+    repeats = int(round(1./factor))
+    return np.repeat(np.repeat(field, repeats, axis=0), repeats, axis=1)
+
+def runCase(scheme, spacing, dt, tEnd):
+    '''
+    Run the Kelvin-Helmholtz case to tEnd with a fixed timestep on a mesh of the given spacing,
+    starting from the initial conditions of the 100 m mesh.
+    
+    Returns
+    tracer:  Tracer field at tEnd
+    elapsed: Wall-clock time (s) of the solver loop
+    '''
+    standardMesh = cubeMesh2D(xPeriodic=True)
+    mesh = cubeMesh2D(xPeriodic=True, dx=spacing, dz=spacing)
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    
+    u, rho, tracer = initialConditions(mesh)
+    for field, standardField in zip([u, rho, tracer], initialConditions(standardMesh)):
+        field[...] = resample(standardField, spacing/standardMesh.dx)
+    
+    step = eulerSolver(fvc, g, [rho, u, tracer], scheme=scheme)
+    
+    timeInit = time.time()
+    for i in xrange(int(round(tEnd/dt))):
+        step(dt)
+    elapsed = time.time() - timeInit
+    
+    return tracer, elapsed
+
+def main(spacings=[400., 200., 100.], referenceSpacing=50., dt=0.05, tEnd=100.):
+    print "Computing reference solution"
+    reference, elapsed = runCase("MUSCL", referenceSpacing, dt, tEnd)
+    
+    print "\n{:>10} {:>10} {:>10} {:>12} {:>10}".format("scheme", "dx (m)", "cells", "error", "time (s)")
+    errors = {}
+    for scheme in ["upwind", "minmod", "vanLeer", "superbee", "MUSCL"]:
+        for spacing in spacings:
+            tracer, elapsed = runCase(scheme, spacing, dt, tEnd)
+            error = np.sqrt(np.mean((tracer - resample(reference, int(round(spacing/referenceSpacing))))**2))
+            errors[scheme, spacing] = (error, elapsed)
+            print "{:>10} {:>10.0f} {:>10} {:>12.3e} {:>10.2f}".format(scheme, spacing, tracer.size, error, elapsed)
+    
+    target, targetElapsed = errors["upwind", 100.]
+    print "\nCoarsest mesh at least as accurate as upwind at dx=100 m (error {:.3e}, {:.2f}s)".format(target, targetElapsed)
+    for scheme in ["upwind", "minmod", "vanLeer", "superbee", "MUSCL"]:
+        matching = [spacing for spacing in spacings if errors[scheme, spacing][0] <= target]
+        if matching == []:
+            print "{:>10}: none".format(scheme)
+            continue
+        spacing = max(matching)
+        error, elapsed = errors[scheme, spacing]
+        print "{:>10}: dx={:.0f} m, error {:.3e}, {:.2f}s".format(scheme, spacing, error, elapsed)
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
@@ -0,0 +1,96 @@
+'''
+Throughput of the finite volume operators for the interleaved (nz, nx, 2) and the
+component-major (2, nz, nx) memory layouts of vector fields, on the Kelvin-Helmholtz
+initial conditions. Both layouts give identical results.
+'''
+import os
+import sys
+import time
+import numpy as np
+
+# User-made modules
+sys.path.append( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+from src.objects.cubeMesh2D import cubeMesh2D
+from src.objects.finiteVolumeCalculations import finiteVolumeFunctions
+from src.utilities.fieldOperations import *
+
+from kelvinHelmholtz import initialConditions, rightHandSide
+
+def benchmarks(mesh):
+    '''
+    Operators to time on a mesh, as a list of (name, function) where each function writes its
+    result into preallocated arrays and returns them.
+    '''
+    fvc = finiteVolumeFunctions(mesh)
+    g = mesh.volVectorField.copy(order="K")
+    u, rho, tracer = initialConditions(mesh)
+    u[:,:,1] = np.sin(mesh.x/1e3)
+    state = [rho, u, tracer]
+    
+    flux = fvc.flux(u)
+    gradTracer = mesh.volVectorField.copy(order="K")
+    uGradTracer = mesh.volScalarField.copy()
+    uGradU = mesh.volVectorField.copy(order="K")
+    divRho = mesh.volScalarField.copy()
+    tendency = [mesh.volScalarField.copy(), mesh.volVectorField.copy(order="K"), mesh.volScalarField.copy()]
+    tendencies = rightHandSide(fvc, g, state)
+    
+    def grad():
+        return [fvc.grad(tracer, "upwind", u=u, out=gradTracer, flux=flux)]
+    
+    def div():
+        return [fvc.div(rho, u, "upwind", out=divRho, flux=flux)]
+    
+    def uDotGradU():
+        return [fvc.uDotGradU(u, "upwind", out=uGradU, flux=flux)]
+    
+    def dotProduct():
+        return [dot(u, gradTracer, out=uGradTracer)]
+    
+    def faceFluxes():
+        flux.invalidate()
+        return list(flux.faceValues())
+    
+    def allTendencies():
+        tendencies(state, tendency)
+        return tendency
+    
+    return [
+        ("grad", grad), ("div", div), ("uDotGradU", uDotGradU), ("dot", dotProduct),
+        ("faceFluxes", faceFluxes), ("rightHandSide", allTendencies)
+    ]
+
+def main(nCells=[250, 1000, 2000], repeats=10):
+    for n in nCells:
+        meshes = [
+            cubeMesh2D(xmin=0., xmax=n*1e1, dx=1e1, xPeriodic=True, zmin=0., zmax=n*1e1, dz=1e1, componentMajor=componentMajor)
+            for componentMajor in [False, True]
+        ]
+        
+        print "\n{}x{} mesh, Mcells/s".format(n, n)
+        print "{:>14} {:>12} {:>15} {:>8} {:>10}".format("operator", "interleaved", "componentMajor", "gain", "max diff")
+        
+        interleaved, componentMajor = [benchmarks(mesh) for mesh in meshes]
+        for (name, function1), (name, function2) in zip(interleaved, componentMajor):
+            throughput = []
+            for function in [function1, function2]:
+                function()
+                timeInit = time.time()
+                for i in xrange(repeats):
+                    function()
+                throughput.append(repeats*n*n/(time.time()-timeInit)/1e6)
+            
+            difference = max(np.abs(result1-result2).max() for result1, result2 in zip(function1(), function2()))
+            print "{:>14} {:>12.1f} {:>15.1f} {:>8.2f} {:>10.1e}".format(
+                name, throughput[0], throughput[1], throughput[1]/throughput[0], difference
+            )
+
+
+
+
+
+if __name__ == "__main__":
+    timeInit = time.time()
+    main()
+    timeElapsed = time.time()
+    print "Elapsed time: {:.2f}s".format(timeElapsed-timeInit)
\ No newline at end of file
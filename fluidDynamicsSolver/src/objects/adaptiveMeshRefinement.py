@@ -0,0 +1,262 @@
+import numpy as np
+from .cubeMesh2D import cubeMesh2D
+from .finiteVolumeCalculations import finiteVolumeFunctions
+from ..utilities.fieldOperations import *
+
+class refinementPatch:
+    "Fine mesh over a strip of rows of the coarse mesh, with its fields (stored with a halo) and solver"
+    def __init__(self, mesh, rows, ratio, solver):
+        self.rows = rows
+        self.ratio = ratio
+        
+        # The strip spans the whole mesh in x, so only its top and bottom can be coarse-fine boundaries
+        self.mesh = cubeMesh2D(
+            xmin=mesh.xmin, xmax=mesh.xmax, dx=mesh.dx/ratio, xPeriodic=mesh.xPeriodic,
+            zmin=mesh.zmax-rows.stop*mesh.dz, zmax=mesh.zmax-rows.start*mesh.dz, dz=mesh.dz/ratio,
+            componentMajor=mesh.componentMajor, dtype=mesh.dtype
+        )
+        self.mesh.topBoundary = "interface"
+        self.mesh.bottomBoundary = "interface"
+        if rows.start == 0 and mesh.topBoundary == "wall":
+            self.mesh.topBoundary = "wall"
+        if rows.stop == mesh.zNCells and mesh.bottomBoundary == "wall":
+            self.mesh.bottomBoundary = "wall"
+        
+        # Coarse rows next to the strip, which fill the ghost rows above and below it
+        self.upperRow = (rows.start-1) % mesh.zNCells
+        self.lowerRow = rows.stop % mesh.zNCells
+        
+        self.fvc = finiteVolumeFunctions(self.mesh)
+        self.solver = solver
+        self.state = []
+        self.halos = []
+    
+    def allocate(self, coarseState):
+        for field in coarseState:
+            if field.ndim == 2:
+                haloField = self.mesh.haloScalarField.copy()
+            else:
+                haloField = self.mesh.haloVectorField.copy(order="K")
+            self.halos.append(haloField)
+            self.state.append(self.mesh.interior(haloField))
+        
+        self.step = self.solver(self.fvc, self.state)
+
+class adaptiveMeshRefinement:
+    """
+    Block-structured refinement of a cubeMesh2D. Strips of rows where the tracer or vorticity
+    gradients are large are covered by patches refined by ratio in both directions, each with its
+    own finiteVolumeFunctions and solver. A step advances the coarse mesh by dt, then each patch
+    by ratio substeps of dt/ratio (Berger-Oliger subcycling), with the patch ghost rows filled
+    from the coarse mesh interpolated in time. The coarse cells under a patch are then replaced
+    by the average of the fine cells.
+    
+    The fields with indices in conservative are updated in conservation form, field -= dt*div(field*u)
+    with the given scheme, at the start of each (sub)step. For these the coarse fluxes through the
+    coarse-fine faces are replaced by the sum of the fine fluxes (refluxing), so that the coarse
+    and fine meshes together conserve them as a single mesh would.
+    
+    solver(fvc, state) must return step(dt), updating the fields in state in place; state holds
+    fields of the mesh of fvc in the order of the coarse state, with the indices velocity (u)
+    and tracer used to flag cells for refinement.
+    """
+    def __init__(
+        self, mesh, solver,
+        ratio=2,
+        threshold=0.05,
+        buffer=3,
+        regridInterval=10,
+        velocity=1,
+        tracer=2,
+        conservative=[0],
+        scheme="upwind"
+    ):
+        if mesh.ensembleShape != ():
+            raise ValueError("Mesh refinement of an ensemble mesh is not supported, use mesh.member()")
+        
+        self.mesh = mesh
+        self.fvc = finiteVolumeFunctions(mesh)
+        self.solver = solver
+        self.ratio = ratio
+        self.threshold = threshold
+        self.buffer = buffer
+        self.regridInterval = regridInterval
+        self.velocity = velocity
+        self.tracer = tracer
+        self.conservative = conservative
+        self.scheme = scheme
+        
+        # Mesh refined everywhere, on which the patches lie
+        self.fineMesh = cubeMesh2D(
+            xmin=mesh.xmin, xmax=mesh.xmax, dx=mesh.dx/ratio, xPeriodic=mesh.xPeriodic,
+            zmin=mesh.zmin, zmax=mesh.zmax, dz=mesh.dz/ratio, zPeriodic=mesh.zPeriodic,
+            componentMajor=mesh.componentMajor, dtype=mesh.dtype
+        )
+        
+        self.state = []
+        self.patches = []
+        self.steps = 0
+    
+    def start(self, state, fineState=None):
+        """
+        Use the coarse fields in state, which are updated in place, and cover the flagged rows
+        with patches. If given, fineState holds the fields on fineMesh, which then set both the
+        coarse fields (averaged) and the patches.
+        """
+        self.state = state
+        if fineState is not None:
+            for field, fineField in zip(state, fineState):
+                field[...] = self.restrict(fineField)
+        
+        self.coarseStep = self.solver(self.fvc, self.state)
+        self.regrid(fineState)
+    
+    def prolong(self, field):
+        "Copy each coarse cell to the ratio x ratio fine cells which make it up"
+        return np.repeat(np.repeat(field, self.ratio, axis=0), self.ratio, axis=1)
+    
+    def restrict(self, fineField):
+        "Average of the ratio x ratio fine cells which make up each coarse cell"
+        shape = fineField.shape
+        blocks = fineField.reshape((shape[0]//self.ratio, self.ratio, shape[1]//self.ratio, self.ratio) + shape[2:])
+        return blocks.mean(axis=(1, 3))
+    
+    def flaggedRows(self):
+        """
+        Rows of the coarse mesh where the change in tracer or vorticity across a cell is more than
+        threshold times the range of the tracer or the largest speed, widened by buffer rows
+        """
+        u = self.state[self.velocity]
+        tracer = self.state[self.tracer]
+        spacing = max(self.mesh.dx, self.mesh.dz)
+        
+        tracerRange = max(tracer.max() - tracer.min(), self.fvc.small)
+        tracerJump = mag(self.fvc.grad(tracer, "linear"))*spacing/tracerRange
+        
+        gradUx = self.fvc.grad(u[...,0], "linear")
+        gradUz = self.fvc.grad(u[...,1], "linear")
+        vorticity = gradUz[...,0] - gradUx[...,1]
+        vorticityJump = np.abs(vorticity)*spacing/max(mag(u).max(), self.fvc.small)
+        
+        flagged = np.any((tracerJump > self.threshold) | (vorticityJump > self.threshold), axis=1)
+        
+        window = np.ones(2*self.buffer+1)
+        if self.mesh.zPeriodic:
+            padded = np.concatenate([flagged[-self.buffer:], flagged, flagged[:self.buffer]])
+            return np.convolve(padded, window, mode="valid") > 0
+        return np.convolve(flagged, window, mode="same") > 0
+    
+    def regrid(self, fineState=None):
+        "Cover each run of flagged rows with a patch, keeping the fine values where patches overlap"
+        flagged = self.flaggedRows()
+        
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], flagged.astype(int), [0]])))
+        runs = [slice(start, stop) for start, stop in zip(edges[0::2], edges[1::2])]
+        
+        oldPatches = dict(((patch.rows.start, patch.rows.stop), patch) for patch in self.patches)
+        
+        self.patches = []
+        for rows in runs:
+            if (rows.start, rows.stop) in oldPatches and fineState is None:
+                self.patches.append(oldPatches.pop((rows.start, rows.stop)))
+                continue
+            
+            patch = refinementPatch(self.mesh, rows, self.ratio, self.solver)
+            patch.allocate(self.state)
+            
+            fineRows = slice(rows.start*self.ratio, rows.stop*self.ratio)
+            for index, field in enumerate(patch.state):
+                if fineState is not None:
+                    field[...] = fineState[index][fineRows]
+                else:
+                    field[...] = self.prolong(self.state[index][rows])
+            
+            for oldPatch in oldPatches.values():
+                start = max(rows.start, oldPatch.rows.start)
+                stop = min(rows.stop, oldPatch.rows.stop)
+                if start >= stop:
+                    continue
+                new = slice((start-rows.start)*self.ratio, (stop-rows.start)*self.ratio)
+                old = slice((start-oldPatch.rows.start)*self.ratio, (stop-oldPatch.rows.start)*self.ratio)
+                for field, oldField in zip(patch.state, oldPatch.state):
+                    field[new] = oldField[old]
+            
+            self.patches.append(patch)
+    
+    def interfaceFluxes(self, fvc, state, faces):
+        "z face fluxes (see finiteVolumeFunctions.faceFluxes) of the conservative fields on rows of faces"
+        fluxes = []
+        for index in self.conservative:
+            fluxz = fvc.faceFluxes(state[index], state[self.velocity], self.scheme)[1]
+            fluxes.append([fluxz[face].copy() for face in faces])
+        
+        return fluxes
+    
+    def fillGhosts(self, patch, oldRows, fraction):
+        "Fill the ghost rows at coarse-fine boundaries, interpolated between the old and new coarse values"
+        for haloField, field, (oldUpper, oldLower) in zip(patch.halos, self.state, oldRows):
+            if patch.mesh.topBoundary == "interface":
+                upper = (1.-fraction)*oldUpper + fraction*field[patch.upperRow]
+                haloField[0,1:-1] = np.repeat(upper, self.ratio, axis=0)
+            if patch.mesh.bottomBoundary == "interface":
+                lower = (1.-fraction)*oldLower + fraction*field[patch.lowerRow]
+                haloField[-1,1:-1] = np.repeat(lower, self.ratio, axis=0)
+    
+    def reflux(self, patch, coarseFluxes, fineFluxes, dt):
+        """
+        Correct the coarse cells next to the patch by the difference between the fine and coarse
+        fluxes through their shared faces, over the coarse step
+        """
+        for index, coarse, fine in zip(self.conservative, coarseFluxes, fineFluxes):
+            field = self.state[index]
+            for side, (coarseFlux, fineFlux) in enumerate(zip(coarse, fine)):
+                # Sum over the ratio fine faces of each coarse face, in units of the coarse cell volume
+                fineFlux = fineFlux.reshape(-1, self.ratio).sum(axis=1)/self.ratio**3
+                correction = dt*(fineFlux - coarseFlux)
+                if side == 0 and patch.mesh.topBoundary == "interface":
+                    field[patch.upperRow] += correction
+                if side == 1 and patch.mesh.bottomBoundary == "interface":
+                    field[patch.lowerRow] -= correction
+    
+    def step(self, dt):
+        "Advance the coarse mesh by dt and every patch by ratio substeps, then regrid if due"
+        oldRows = []
+        coarseFluxes = []
+        for patch in self.patches:
+            oldRows.append([(field[patch.upperRow].copy(), field[patch.lowerRow].copy()) for field in self.state])
+            coarseFluxes.append(self.interfaceFluxes(self.fvc, self.state, [patch.rows.start, patch.rows.stop]))
+        
+        self.coarseStep(dt)
+        
+        for patch, patchRows, patchFluxes in zip(self.patches, oldRows, coarseFluxes):
+            fineFluxes = [[0., 0.] for index in self.conservative]
+            
+            for substep in xrange(self.ratio):
+                self.fillGhosts(patch, patchRows, float(substep)/self.ratio)
+                
+                for sums, fluxes in zip(fineFluxes, self.interfaceFluxes(patch.fvc, patch.state, [0, -1])):
+                    sums[0] += fluxes[0]
+                    sums[1] += fluxes[1]
+                
+                patch.step(dt/self.ratio)
+            
+            self.reflux(patch, patchFluxes, fineFluxes, dt)
+            
+            for field, fineField in zip(self.state, patch.state):
+                field[patch.rows] = self.restrict(fineField)
+        
+        self.steps += 1
+        if self.steps % self.regridInterval == 0:
+            self.regrid()
+    
+    def nCells(self):
+        "Number of cells on the coarse mesh and all patches"
+        return self.mesh.xNCells*self.mesh.zNCells + sum(patch.mesh.xNCells*patch.mesh.zNCells for patch in self.patches)
+    
+    def refined(self, index):
+        "Field of the given index on fineMesh, from the patches where there are any and the coarse mesh elsewhere"
+        field = self.prolong(self.state[index])
+        for patch in self.patches:
+            field[patch.rows.start*self.ratio:patch.rows.stop*self.ratio] = patch.state[index]
+        
+        return field
\ No newline at end of file
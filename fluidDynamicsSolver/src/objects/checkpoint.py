@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+from .cubeMesh2D import cubeMesh2D
+
+class checkpoint:
+    """
+    Checkpoints of a run in the folder path: the fields of state (with their ghost cells, for fields
+    stored with a halo) as memory-mapped .npy files, and the mesh definition and runSettings progress
+    in checkpoint.json. A new checkpoint is written next to the last one and then replaces it, so an
+    interruption while saving leaves the last one intact.
+    Restoring the fields and runSettings progress resumes the run bit for bit, for solvers which keep
+    no state of their own between steps other than what they recompute from the fields, as long as
+    the runSettings are unchanged (a restart takes them from the script, see runSettings.setState).
+    due() is True every stepInterval steps and after wallInterval seconds of wall-clock time since
+    the last checkpoint (0 disables either). Outputs written alongside the run (e.g. diagnostics)
+    can be attached, to be flushed with every checkpoint, so that they are complete up to it.
+    """
+    def __init__(self, path, stepInterval=0, wallInterval=0., names=None):
+        self.path = path
+        self.stepInterval = stepInterval
+        self.wallInterval = wallInterval
+        self.names = names
+        
+        self.outputs = []
+        self.lastSave = time.time()
+    
+    def attach(self, output):
+        "Flush output (anything with a flush method) before every save"
+        self.outputs.append(output)
+    
+    def exists(self):
+        return os.path.isfile(os.path.join(self.path, "checkpoint.json"))
+    
+    def due(self, simulation):
+        if self.stepInterval > 0 and simulation.currentTimeIndex % self.stepInterval == 0:
+            return True
+        return self.wallInterval > 0. and time.time() - self.lastSave >= self.wallInterval
+    
+    def fieldNames(self, state):
+        if self.names is not None:
+            return self.names
+        return ["field{}".format(index) for index in xrange(len(state))]
+    
+    def save(self, mesh, simulation, state):
+        "Write the fields in state, the mesh definition and the runSettings progress"
+        for output in self.outputs:
+            output.flush()
+        
+        newPath = self.path + ".new"
+        if os.path.isdir(newPath):
+            shutil.rmtree(newPath)
+        os.makedirs(newPath)
+        
+        for name, field in zip(self.fieldNames(state), state):
+            haloField = mesh.haloOf(field)
+            if haloField is not None:
+                field = haloField
+            stored = np.lib.format.open_memmap(os.path.join(newPath, name+".npy"), mode="w+", dtype=field.dtype, shape=field.shape)
+            stored[...] = field
+            stored.flush()
+            del stored
+        
+        description = {
+            "mesh": mesh.definition(),
+            "boundaries": [mesh.topBoundary, mesh.bottomBoundary],
+            "simulation": simulation.getState(),
+            "names": self.fieldNames(state),
+            "wallTime": time.time()
+        }
+        with open(os.path.join(newPath, "checkpoint.json"), "w") as descriptionFile:
+            json.dump(description, descriptionFile)
+        
+        # Replace the last checkpoint only once the new one is complete
+        oldPath = self.path + ".old"
+        if os.path.isdir(self.path):
+            os.rename(self.path, oldPath)
+        os.rename(newPath, self.path)
+        if os.path.isdir(oldPath):
+            shutil.rmtree(oldPath)
+        
+        self.lastSave = time.time()
+    
+    def description(self):
+        with open(os.path.join(self.path, "checkpoint.json")) as descriptionFile:
+            return json.load(descriptionFile)
+    
+    def mesh(self):
+        "The mesh of the checkpointed run"
+        description = self.description()
+        definition = dict((str(name), value) for name, value in description["mesh"].items())
+        
+        mesh = cubeMesh2D(**definition)
+        mesh.topBoundary, mesh.bottomBoundary = [str(boundary) for boundary in description["boundaries"]]
+        return mesh
+    
+    def restore(self, mesh, simulation, state):
+        """
+        Copy the checkpointed fields into the fields of state (keeping their storage) and set the
+        runSettings progress, so that the run continues from the next step
+        """
+        description = self.description()
+        
+        for name, field in zip(description["names"], state):
+            stored = np.load(os.path.join(self.path, name+".npy"), mmap_mode="r")
+            haloField = mesh.haloOf(field)
+            if haloField is not None and haloField.shape == stored.shape:
+                haloField[...] = stored
+            elif stored.shape == field.shape:
+                field[...] = stored
+            else:
+                field[...] = mesh.interior(stored)
+        
+        simulation.setState(description["simulation"])
+        self.lastSave = time.time()
\ No newline at end of file
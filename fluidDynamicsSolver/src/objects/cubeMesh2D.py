@@ -4,7 +4,8 @@ class cubeMesh2D:
     def __init__(
         self, 
         xmin=-1e4, xmax=1e4, dx=1e2, xPeriodic=False, 
-        zmin=0e0, zmax=1e4, dz=1e2, zPeriodic=False
+        zmin=0e0, zmax=1e4, dz=1e2, zPeriodic=False,
+        componentMajor=False, dtype=np.float64, ensembleSize=None
     ):
         
         self.xmin = xmin
@@ -13,61 +14,217 @@ class cubeMesh2D:
         self.xPeriodic = xPeriodic
         
         self.dy = 1.
-
+        
         self.zmin = zmin
         self.zmax = zmax
         self.dz = dz
         self.zPeriodic = zPeriodic
-
+        
+        self.componentMajor = componentMajor
+        
+        #Floating point type of every field on the mesh, e.g. np.float32 to halve memory and bandwidth
+        self.dtype = np.dtype(dtype)
+        
+        #Number of ensemble members, stacked along a leading axis of every field, or None for a single member
+        self.ensembleSize = ensembleSize
+        self.ensembleShape = () if ensembleSize is None else (ensembleSize,)
+        
         self.xNCells = int(round( (xmax-xmin)/dx ))
         self.xCells = np.linspace(xmin+dx/2., xmax-dx/2., self.xNCells)
         self.xFaces = np.linspace(xmin, xmax-dx, self.xNCells)
-
+        
         self.zNCells = int(round( (zmax-zmin)/dz ))
         self.zCells = np.linspace(zmin+dz/2., zmax-dz/2., self.zNCells)
         self.zFaces = np.linspace(zmin, zmax-dz, self.zNCells)
         
-        #Construct empty cell-centred fields.
-        self.volScalarField = np.zeros((self.zNCells, self.xNCells))
-        self.volVectorField = np.zeros((self.zNCells, self.xNCells, 2))
+        #Construct empty cell-centred fields. The scalar templates are read-only broadcasts of zero,
+        #their copies are full arrays; vector fields hold their memory layout (see vectorField).
+        self.volScalarField = np.broadcast_to(self.dtype.type(0), self.ensembleShape+(self.zNCells, self.xNCells))
+        self.volVectorField = self.vectorField((self.zNCells, self.xNCells))
         
         #Construct empty fields for cell faces
-        self.surfaceScalarField = np.zeros((self.zNCells, self.xNCells))
-        self.surfaceVectorField = np.zeros((self.zNCells, self.xNCells, 2))
+        self.surfaceScalarField = np.broadcast_to(self.dtype.type(0), self.ensembleShape+(self.zNCells, self.xNCells))
+        self.surfaceVectorField = np.broadcast_to(self.dtype.type(0), self.ensembleShape+(self.zNCells, self.xNCells, 2))
+        
+        #Shapes of the values on all x faces and all z faces
+        self.xFaceShape = self.ensembleShape+(self.zNCells, self.xNCells+1)
+        self.zFaceShape = self.ensembleShape+(self.zNCells+1, self.xNCells)
+        
+        #Construct empty halo-padded fields, with one layer of ghost cells around the mesh
+        self.haloScalarField = np.broadcast_to(self.dtype.type(0), self.ensembleShape+(self.zNCells+2, self.xNCells+2))
+        self.haloVectorField = self.vectorField((self.zNCells+2, self.xNCells+2))
+        
+        #Type of the top (first row) and bottom (last row) boundaries, "wall" (zero gradient),
+        #"periodic", or "interface" between the sub-domains of a domainDecomposition
+        self.topBoundary = "periodic" if zPeriodic else "wall"
+        self.bottomBoundary = "periodic" if zPeriodic else "wall"
+        
+        #Mesh and rows which a block of rows is part of (see rowBlock), None for a whole mesh
+        self.parent = None
+        self.parentRows = None
+    
+    # Coordinate and geometry fields, built on first use (see __getattr__)
+    geometryFields = ["x", "z", "xz", "xf", "zf", "xzf", "xfz", "xSf", "zSf", "cellVolume"]
+    
+    def __getattr__(self, name):
+        """
+        Build a coordinate or geometry field the first time it is used. On the uniform mesh these
+        are read-only views broadcast from the 1D axes or constants, except the coordinate vector
+        fields (xz, xzf, xfz), which are stacked from two of them. They have no ensemble axis and
+        broadcast against the fields of every member.
+        """
+        if name not in self.geometryFields:
+            raise AttributeError(name)
+        
+        shape = (self.zNCells, self.xNCells)
+        
+        #Co-ordinate fields for cell centres and cell faces, z decreases with the row index
+        if name == "x":
+            field = np.broadcast_to(self.xCells.astype(self.dtype), shape)
+        elif name == "z":
+            field = np.broadcast_to(self.zCells[::-1,None].astype(self.dtype), shape)
+        elif name == "xf":
+            field = np.broadcast_to(self.xFaces.astype(self.dtype), shape)
+        elif name == "zf":
+            field = np.broadcast_to(self.zFaces[::-1,None].astype(self.dtype), shape)
+        elif name in ["xz", "xzf", "xfz"]:
+            components = {"xz": ("x", "z"), "xzf": ("x", "zf"), "xfz": ("xf", "z")}[name]
+            field = np.stack([getattr(self, component) for component in components], axis=-1)
+            field.flags.writeable = False
+        
+        #Cell face, surface vector fields
+        elif name == "xSf":
+            field = np.broadcast_to(np.array([self.dy*self.dz, 0.], dtype=self.dtype), shape+(2,))
+        elif name == "zSf":
+            field = np.broadcast_to(np.array([0., self.dx*self.dy], dtype=self.dtype), shape+(2,))
+        
+        elif name == "cellVolume":
+            field = np.broadcast_to(self.dtype.type(self.dx*self.dy*self.dz), shape)
         
-        self.cellVolume = self.volScalarField.copy() + self.dx*self.dy*self.dz
+        setattr(self, name, field)
+        return field
+    
+    def definition(self):
+        "Arguments which rebuild the mesh with cubeMesh2D(**definition), e.g. from a checkpoint"
+        return {
+            "xmin": self.xmin, "xmax": self.xmax, "dx": self.dx, "xPeriodic": self.xPeriodic,
+            "zmin": self.zmin, "zmax": self.zmax, "dz": self.dz, "zPeriodic": self.zPeriodic,
+            "componentMajor": self.componentMajor, "dtype": self.dtype.str, "ensembleSize": self.ensembleSize
+        }
+    
+    def vectorField(self, shape):
+        """
+        Empty vector field, indexed as field[k,i,component] (field[m,k,i,component] for an ensemble).
+        With componentMajor the components are stored one after the other, (2, nz, nx) in memory,
+        so that each component is contiguous. Vector fields should be copied with copy(order="K"),
+        which keeps their layout.
+        """
+        if self.componentMajor:
+            return np.moveaxis(np.zeros(self.ensembleShape+(2,)+shape, dtype=self.dtype), len(self.ensembleShape), -1)
         
-        #Construct co-ordinate fields for cell centres
-        self.x = self.volScalarField.copy()
-        self.x[:,:] = self.xCells
+        return np.zeros(self.ensembleShape+shape+(2,), dtype=self.dtype)
+    
+    def isVector(self, field):
+        return field.ndim > len(self.ensembleShape)+2
+    
+    def planes(self, field):
+        "View of a field with the vector components (if any) first, so the last two axes are always (z, x)"
+        if self.isVector(field):
+            return np.moveaxis(field, -1, 0)
+        return field
+    
+    def interior(self, haloField):
+        "View of the mesh cells of a halo-padded field, excluding the ghost cells"
+        if self.isVector(haloField):
+            return haloField[...,1:-1,1:-1,:]
+        return haloField[...,1:-1,1:-1]
+    
+    def fillHalo(self, haloField):
+        "Fill the ghost cells of a halo-padded field for periodic or zero-gradient boundaries"
+        padded = self.planes(haloField)
         
-        self.z = self.volScalarField.copy()
-        for k in xrange(self.xNCells):
-            self.z[:,k] = self.zCells[::-1]
+        if self.xPeriodic:
+            padded[...,1:-1,0] = padded[...,1:-1,-2]
+            padded[...,1:-1,-1] = padded[...,1:-1,1]
+        else:
+            padded[...,1:-1,0] = padded[...,1:-1,1]
+            padded[...,1:-1,-1] = padded[...,1:-1,-2]
         
-        self.xz = self.volVectorField.copy()
-        self.xz[:,:,0] = self.x
-        self.xz[:,:,1] = self.z
+        if self.zPeriodic:
+            padded[...,0,:] = padded[...,-2,:]
+            padded[...,-1,:] = padded[...,1,:]
         
-        #Construct co-ordinate fields for cell faces
-        self.xf = self.surfaceScalarField.copy()
-        self.xf[:,:] = self.xFaces
+        if self.topBoundary == "wall":
+            padded[...,0,:] = padded[...,1,:]
+        if self.bottomBoundary == "wall":
+            padded[...,-1,:] = padded[...,-2,:]
         
-        self.zf = self.surfaceScalarField.copy()
-        for k in xrange(self.xNCells):
-            self.zf[:,k] = self.zFaces[::-1]
+        return haloField
+    
+    def haloOf(self, field, rows=None):
+        """
+        Return the halo-padded storage which a cell field (or vector component) is a view of, or None.
+        With rows (a slice), field is a view of those rows of the cells, and the rows of the storage
+        which pad them are returned. Fields of a rowBlock are looked up in the storage of its parent.
+        """
+        if rows is None and self.parent is not None:
+            haloField = self.parent.haloOf(field, self.parentRows)
+            if haloField is not None:
+                return haloField
         
-        self.xzf = self.surfaceVectorField.copy()
-        self.xzf[:,:,0] = self.x
-        self.xzf[:,:,1] = self.zf
+        haloShape = self.ensembleShape+(self.zNCells+2, self.xNCells+2)
+        haloField = field.base
+        if haloField is None or haloField.shape[:len(haloShape)] != haloShape:
+            return None
         
-        self.xfz = self.surfaceVectorField.copy()
-        self.xfz[:,:,0] = self.xf
-        self.xfz[:,:,1] = self.z
+        candidates = [haloField]
+        if haloField.ndim == len(haloShape)+1 and field.ndim == len(haloShape):
+            candidates = [haloField[...,i] for i in xrange(haloField.shape[-1])]
         
-        #Cell face, surface vector field
-        self.xSf = self.surfaceVectorField.copy()
-        self.xSf[:,:,0] += self.dy*self.dz
+        for candidate in candidates:
+            cells = self.interior(candidate)
+            if rows is not None:
+                cells = self.rowsOf(cells, rows)
+                candidate = self.rowsOf(candidate, slice(rows.start, rows.stop+2))
+            if (
+                cells.shape == field.shape and cells.strides == field.strides and 
+                cells.__array_interface__["data"][0] == field.__array_interface__["data"][0]
+            ):
+                return candidate
         
-        self.zSf = self.surfaceVectorField.copy()
-        self.zSf[:,:,1] += self.dx*self.dy
\ No newline at end of file
+        return None
+    
+    def rowsOf(self, field, rows):
+        "View of a block of rows of a cell field"
+        if self.isVector(field):
+            return field[...,rows,:,:]
+        return field[...,rows,:]
+    
+    def rowBlock(self, rows):
+        """
+        Mesh of a block of rows (a slice), with "interface" boundaries between blocks. The rows of
+        fields stored with a halo on this mesh (see rowsOf) are found by haloOf on the block, with
+        the neighbouring rows as the ghost cells of the block, so operators on the block read the
+        same values as on the whole mesh.
+        """
+        mesh = cubeMesh2D(
+            xmin=self.xmin, xmax=self.xmax, dx=self.dx, xPeriodic=self.xPeriodic,
+            zmin=self.zmax-rows.stop*self.dz, zmax=self.zmax-rows.start*self.dz, dz=self.dz,
+            componentMajor=self.componentMajor, dtype=self.dtype, ensembleSize=self.ensembleSize
+        )
+        mesh.topBoundary = self.topBoundary if rows.start == 0 else "interface"
+        mesh.bottomBoundary = self.bottomBoundary if rows.stop == self.zNCells else "interface"
+        mesh.parent = self
+        mesh.parentRows = rows
+        return mesh
+    
+    def member(self):
+        "Mesh of a single ensemble member, with the same geometry, layout and boundaries"
+        mesh = cubeMesh2D(
+            xmin=self.xmin, xmax=self.xmax, dx=self.dx, xPeriodic=self.xPeriodic,
+            zmin=self.zmin, zmax=self.zmax, dz=self.dz, zPeriodic=self.zPeriodic,
+            componentMajor=self.componentMajor, dtype=self.dtype
+        )
+        mesh.topBoundary = self.topBoundary
+        mesh.bottomBoundary = self.bottomBoundary
+        return mesh
\ No newline at end of file
@@ -0,0 +1,151 @@
+import os
+import json
+import collections
+import numpy as np
+from ..utilities.fieldOperations import *
+
+class diagnostics:
+    """
+    Reductions of the fields computed in the solver loop, written as a time series with one column
+    per diagnostic: kinetic energy, enstrophy, mass and its relative change since the first record,
+    the mixing layer thickness (the integral of 4c(1-c) over z, averaged over x, with c the tracer
+    scaled to [0,1] by its initial range) and the fields at the cells nearest each probe (x, z).
+    A record is taken every interval calls of record. Records are kept in a buffer of bufferSize
+    rows, then appended to one raw float64 file per column (<name>.bin, see readDiagnostics).
+    If saturationColumn is given, saturated() is True once that column has changed by less than
+    saturationTolerance (relative) over the last saturationWindow records, to stop the run.
+    With append=True an existing time series is extended, e.g. for a restarted run, keeping its
+    initial mass and tracer range. Buffered records are lost if the run is killed, so the buffer
+    is flushed with every checkpoint (see checkpoint.attach).
+    """
+    def __init__(
+        self, fvc, path,
+        probes=[],
+        interval=1,
+        bufferSize=1000,
+        saturationColumn=None,
+        saturationWindow=200,
+        saturationTolerance=1e-3,
+        append=False
+    ):
+        self.fvc = fvc
+        self.mesh = fvc.mesh
+        self.path = path
+        self.interval = interval
+        self.saturationColumn = saturationColumn
+        self.saturationTolerance = saturationTolerance
+        
+        # Cell indices of each probe, row 0 is the top of the mesh
+        self.probes = []
+        for x, z in probes:
+            i = int(np.argmin(np.abs(self.mesh.xCells - x)))
+            k = self.mesh.zNCells - 1 - int(np.argmin(np.abs(self.mesh.zCells - z)))
+            self.probes.append((k, i))
+        
+        self.columns = ["time", "kineticEnergy", "enstrophy", "mass", "massError", "mixingThickness"]
+        for index in xrange(len(self.probes)):
+            self.columns += ["probe{}_{}".format(index, name) for name in ["rho", "ux", "uz", "tracer"]]
+        
+        self.buffer = np.zeros((bufferSize, len(self.columns)))
+        self.rows = 0
+        self.calls = 0
+        self.history = collections.deque(maxlen=saturationWindow)
+        
+        self.gradUx = self.mesh.volVectorField.copy(order="K")
+        self.gradUz = self.mesh.volVectorField.copy(order="K")
+        self.initialMass = None
+        self.tracerRange = None
+        
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        
+        if append and os.path.isfile(os.path.join(path, "columns.json")):
+            existing = readDiagnostics(path)
+            if sorted(existing.keys()) != sorted(self.columns):
+                raise ValueError("Cannot append to {}, its columns differ".format(path))
+            rangePath = os.path.join(path, "tracerRange.json")
+            if len(existing["mass"]) == 0 or not os.path.isfile(rangePath):
+                # The restarted run would take its initial mass and tracer range from the restart
+                raise ValueError("Cannot append to {}, it has no records".format(path))
+            self.initialMass = existing["mass"][0]
+            with open(rangePath) as rangeFile:
+                self.tracerRange = tuple(json.load(rangeFile))
+            return
+        
+        with open(os.path.join(path, "columns.json"), "w") as columnsFile:
+            json.dump(self.columns, columnsFile)
+        for name in self.columns:
+            open(os.path.join(path, name+".bin"), "wb").close()
+    
+    def record(self, currentTime, rho, u, tracer):
+        "Compute the diagnostics every interval calls, returning the row of values (or None)"
+        self.calls += 1
+        if (self.calls - 1) % self.interval != 0:
+            return None
+        
+        cellVolume = self.mesh.dx*self.mesh.dy*self.mesh.dz
+        
+        kineticEnergy = 0.5*np.sum(rho*dot(u, u))*cellVolume
+        
+        self.fvc.grad(u[...,0], "linear", out=self.gradUx)
+        self.fvc.grad(u[...,1], "linear", out=self.gradUz)
+        vorticity = self.gradUz[...,0] - self.gradUx[...,1]
+        enstrophy = 0.5*np.sum(vorticity**2)*cellVolume
+        
+        mass = np.sum(rho)*cellVolume
+        if self.initialMass is None:
+            self.initialMass = mass
+            self.tracerRange = (tracer.min(), max(tracer.max() - tracer.min(), self.fvc.small))
+            with open(os.path.join(self.path, "tracerRange.json"), "w") as rangeFile:
+                json.dump([float(value) for value in self.tracerRange], rangeFile)
+        massError = (mass - self.initialMass)/self.initialMass
+        
+        c = np.clip((tracer - self.tracerRange[0])/self.tracerRange[1], 0., 1.)
+        mixingThickness = 4.*np.sum(c*(1. - c))*self.mesh.dz/self.mesh.xNCells
+        
+        row = [currentTime, kineticEnergy, enstrophy, mass, massError, mixingThickness]
+        for k, i in self.probes:
+            row += [rho[k,i], u[k,i,0], u[k,i,1], tracer[k,i]]
+        
+        self.buffer[self.rows] = row
+        self.rows += 1
+        if self.rows == len(self.buffer):
+            self.flush()
+        
+        if self.saturationColumn is not None:
+            self.history.append(row[self.columns.index(self.saturationColumn)])
+        
+        return row
+    
+    def saturated(self):
+        if self.saturationColumn is None or len(self.history) < self.history.maxlen:
+            return False
+        
+        change = max(self.history) - min(self.history)
+        return change <= self.saturationTolerance*max(abs(self.history[-1]), self.fvc.small)
+    
+    def truncate(self, time):
+        "Drop the records written after time, e.g. past the checkpoint a run is restarted from"
+        self.flush()
+        times = np.fromfile(os.path.join(self.path, "time.bin"), dtype=np.float64)
+        count = int(np.searchsorted(times, time, side="right"))
+        for name in self.columns:
+            with open(os.path.join(self.path, name+".bin"), "ab") as columnFile:
+                columnFile.truncate(count*8)
+    
+    def flush(self):
+        "Append the buffered records to the column files"
+        for column, name in enumerate(self.columns):
+            with open(os.path.join(self.path, name+".bin"), "ab") as columnFile:
+                self.buffer[:self.rows,column].tofile(columnFile)
+        self.rows = 0
+    
+    def close(self):
+        self.flush()
+
+def readDiagnostics(path):
+    "Columns of a time series written by diagnostics, as a dictionary of arrays"
+    with open(os.path.join(path, "columns.json")) as columnsFile:
+        columns = json.load(columnsFile)
+    
+    return dict((str(name), np.fromfile(os.path.join(path, name+".bin"), dtype=np.float64)) for name in columns)
\ No newline at end of file
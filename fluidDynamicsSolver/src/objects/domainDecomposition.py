@@ -0,0 +1,168 @@
+import multiprocessing
+import multiprocessing.sharedctypes as sharedctypes
+import numpy as np
+from .cubeMesh2D import cubeMesh2D
+
+class processBarrier:
+    "Barrier for a fixed number of processes (multiprocessing has no Barrier in Python 2)"
+    def __init__(self, parties):
+        self.parties = parties
+        self.condition = multiprocessing.Condition()
+        self.count = sharedctypes.RawValue("i", 0)
+        self.generation = sharedctypes.RawValue("i", 0)
+    
+    def wait(self):
+        with self.condition:
+            generation = self.generation.value
+            self.count.value += 1
+            if self.count.value == self.parties:
+                self.count.value = 0
+                self.generation.value += 1
+                self.condition.notify_all()
+            else:
+                while generation == self.generation.value:
+                    self.condition.wait()
+
+class domainDecomposition:
+    """
+    Splits a cubeMesh2D into strips of rows, each advanced by its own worker process with the
+    usual finiteVolumeFunctions operators on a sub-domain cubeMesh2D. Fields are stored per strip,
+    with their halo, in shared memory. The halo rows between strips (and across periodic z
+    boundaries) are exchanged with exchange(), while the sub-domain meshes fill wall and x halos
+    as usual. Each cell sees the same values in the same order as on the full mesh, so results
+    are identical to a serial run of the same solver.
+    """
+    def __init__(self, mesh, nDomains):
+        self.mesh = mesh
+        self.nDomains = nDomains
+        
+        if mesh.ensembleShape != ():
+            raise ValueError("Domain decomposition of an ensemble mesh is not supported, use mesh.member()")
+        if nDomains < 1 or 2*nDomains > mesh.zNCells:
+            raise ValueError("Cannot split {} rows into {} domains of at least 2 rows".format(mesh.zNCells, nDomains))
+        
+        # Rows of the full mesh in each strip, row 0 is the top of the mesh
+        edges = [domain*mesh.zNCells//nDomains for domain in xrange(nDomains+1)]
+        self.rows = [slice(edges[domain], edges[domain+1]) for domain in xrange(nDomains)]
+        
+        self.subMeshes = []
+        for domain, rows in enumerate(self.rows):
+            subMesh = cubeMesh2D(
+                xmin=mesh.xmin, xmax=mesh.xmax, dx=mesh.dx, xPeriodic=mesh.xPeriodic,
+                zmin=mesh.zmax-rows.stop*mesh.dz, zmax=mesh.zmax-rows.start*mesh.dz, dz=mesh.dz,
+                componentMajor=mesh.componentMajor, dtype=mesh.dtype
+            )
+            if domain > 0:
+                subMesh.topBoundary = "interface"
+            else:
+                subMesh.topBoundary = mesh.topBoundary
+            if domain < nDomains-1:
+                subMesh.bottomBoundary = "interface"
+            else:
+                subMesh.bottomBoundary = mesh.bottomBoundary
+            self.subMeshes.append(subMesh)
+        
+        # Neighbouring strips above and below each strip, None at walls
+        self.upper = [domain-1 for domain in xrange(nDomains)]
+        self.lower = [domain+1 for domain in xrange(nDomains)]
+        self.upper[0] = nDomains-1 if mesh.zPeriodic else None
+        self.lower[-1] = 0 if mesh.zPeriodic else None
+        
+        # For each field, the halo-padded storage of every strip
+        self.fields = []
+        
+        self.barrier = processBarrier(nDomains)
+        self.workers = []
+    
+    def sharedField(self, field):
+        "Copy a cell field of the full mesh into shared memory, returning the halo-padded strips"
+        strips = []
+        for rows, subMesh in zip(self.rows, self.subMeshes):
+            if field.ndim == 2:
+                haloField = subMesh.haloScalarField
+                strides = None
+            else:
+                # Same memory layout as the vector fields of the sub-domain mesh
+                haloField = subMesh.haloVectorField
+                strides = haloField.strides
+            storage = sharedctypes.RawArray(haloField.dtype.char, haloField.size)
+            haloField = np.ndarray(haloField.shape, dtype=haloField.dtype, buffer=storage, strides=strides)
+            subMesh.interior(haloField)[...] = field[rows]
+            strips.append(haloField)
+        
+        return strips
+    
+    def exchange(self, domain):
+        "Copy the halo rows of a strip from its neighbours, for every field"
+        self.barrier.wait()
+        for strips in self.fields:
+            haloField = strips[domain]
+            if self.upper[domain] is not None:
+                haloField[0] = strips[self.upper[domain]][-2]
+            if self.lower[domain] is not None:
+                haloField[-1] = strips[self.lower[domain]][1]
+        self.barrier.wait()
+    
+    def gather(self, state):
+        "Copy the strips back into the fields of the full mesh"
+        for field, strips in zip(state, self.fields):
+            for rows, subMesh, haloField in zip(self.rows, self.subMeshes, strips):
+                field[rows] = subMesh.interior(haloField)
+    
+    def start(self, state, solver):
+        """
+        Move the fields in state into shared memory and start one worker per strip.
+        solver(mesh, state, exchange, rows) is called in each worker with the sub-domain mesh, its
+        fields and the rows of the full mesh, and must return step(dt). step must call exchange()
+        after each update of the fields, so that the halos are current for the next one.
+        """
+        self.fields = [self.sharedField(field) for field in state]
+        
+        self.commands = [multiprocessing.Queue() for domain in xrange(self.nDomains)]
+        self.results = multiprocessing.Queue()
+        
+        for domain in xrange(self.nDomains):
+            worker = multiprocessing.Process(target=self.worker, args=(domain, solver))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+    
+    def worker(self, domain, solver):
+        subMesh = self.subMeshes[domain]
+        state = [subMesh.interior(strips[domain]) for strips in self.fields]
+        exchange = lambda: self.exchange(domain)
+        
+        try:
+            step = solver(subMesh, state, exchange, self.rows[domain])
+            exchange()
+            
+            command = self.commands[domain].get()
+            while command is not None:
+                dt, nSteps = command
+                for n in xrange(nSteps):
+                    step(dt)
+                self.results.put(None)
+                command = self.commands[domain].get()
+        except Exception as error:
+            self.results.put("Domain {}: {!r}".format(domain, error))
+    
+    def run(self, dt, nSteps=1):
+        "Advance every strip by nSteps timesteps of dt"
+        for commands in self.commands:
+            commands.put((dt, nSteps))
+        
+        for domain in xrange(self.nDomains):
+            error = self.results.get()
+            if error is not None:
+                self.stop()
+                raise RuntimeError(error)
+    
+    def stop(self):
+        for worker, commands in zip(self.workers, self.commands):
+            if worker.is_alive():
+                commands.put(None)
+        for worker in self.workers:
+            worker.join(1.)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
\ No newline at end of file
@@ -1,204 +1,577 @@
 import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as sparseLinalg
+from multiprocessing.pool import ThreadPool
 from ..utilities.fieldOperations import *
+from .fluxContext import fluxContext, fluxBlock
+
+# Flux limiters psi(r) of the TVD schemes, with r the ratio of the upwind difference to the
+# difference across the face. All are second order where the field is smooth.
+tvdLimiters = {
+    "minmod": lambda r: np.maximum(0., np.minimum(1., r)),
+    "vanLeer": lambda r: (r + np.abs(r))/(1. + np.abs(r)),
+    "superbee": lambda r: np.maximum(0., np.maximum(np.minimum(2.*r, 1.), np.minimum(r, 2.))),
+    "MUSCL": lambda r: np.maximum(0., np.minimum(np.minimum(2.*r, 0.5*(1. + r)), 2.))
+}
 
 class finiteVolumeFunctions:
-    def __init__(self, mesh):
+    """
+    Finite volume operators on a cubeMesh2D. With threads, grad, div and laplacian are evaluated on
+    blocks of rows of about cacheSize bytes of working arrays (see rowBlocks) by a pool of threads,
+    which run in parallel as numpy releases the GIL. Results are identical to those on the whole
+    mesh. TVD schemes, whose stencils are wider than the ghost rows, use the whole mesh.
+    """
+    # Number of arrays of the size of a block used by an operator, to size the blocks
+    blockArrays = 8
+    
+    def __init__(self, mesh, threads=None, cacheSize=2**21):
         self.mesh = mesh
-        self.small = self.mesh.volScalarField + 1e-16
+        self.small = mesh.dtype.type(1e-16)
+        
+        # Blocks of rows and the threads which evaluate them, built on first use
+        self.threads = threads
+        self.cacheSize = cacheSize
+        self.blocks = None
+        self.pool = None
+        
+        # Scratch arrays reused between calls, see workspace
+        self.workspaces = {}
+        
+        # Flux context used by operators which are not given one
+        self.localFlux = None
+        
+        self.poissonFactorisation = None
+        self.poissonSignature = None
+        
+        # Iterative/spectral Poisson solvers, rebuilt whenever the mesh changes
+        self.poissonBackends = {}
     
-    def gradComponents(self, field):
-        gradxField = self.mesh.surfaceScalarField.copy()
-        gradxField[:,:] = (field - np.roll(field, 1, axis=1))/self.mesh.dx
-        if not self.mesh.xPeriodic:
-            gradxField[:,0] *= 0.
+    def workspace(self, name, shape, like=None):
+        """
+        Scratch array for intermediate results, allocated the first time each name and shape is requested
+        (with the memory layout of the array like, if given)
+        """
+        key = (name, shape)
+        if key not in self.workspaces:
+            if like is None:
+                self.workspaces[key] = np.empty(shape, dtype=self.mesh.dtype)
+            else:
+                self.workspaces[key] = np.empty_like(like)
+        
+        return self.workspaces[key]
+    
+    def flux(self, u):
+        "Flux context for u, to share face fluxes and upwind factors between operators"
+        return fluxContext(self, u)
+    
+    def fluxFor(self, u, flux=None):
+        "The flux context supplied by the caller, or the internal one reset to u"
+        if flux is not None:
+            return flux
+        
+        if self.localFlux is None or self.localFlux.u.shape != u.shape:
+            self.localFlux = fluxContext(self, u, track=False)
+        self.localFlux.reset(u)
+        
+        return self.localFlux
+    
+    def halo(self, field, name="field"):
+        """
+        Halo-padded version of a cell field with its ghost cells filled, so that stencils can be 
+        evaluated as slices. Fields stored with a halo (see cubeMesh2D.haloOf) are not copied.
+        """
+        haloField = self.mesh.haloOf(field)
+        if haloField is None:
+            haloField = self.workspace("halo"+name, self.mesh.haloScalarField.shape)
+            self.mesh.interior(haloField)[...] = field
+        
+        return self.mesh.fillHalo(haloField)
+    
+    def rowBlocks(self):
+        """
+        Blocks of rows whose working arrays fit in cacheSize bytes, as (rows, operators on the
+        rowBlock mesh), each with its own scratch arrays so that they can be evaluated in parallel
+        """
+        if self.blocks is None:
+            rowBytes = (self.mesh.xNCells+2)*self.mesh.dtype.itemsize*int(np.prod(self.mesh.ensembleShape))
+            rowsPerBlock = max(2, self.cacheSize//(self.blockArrays*rowBytes))
+            nBlocks = max(1, int(round(float(self.mesh.zNCells)/rowsPerBlock)))
+            edges = [block*self.mesh.zNCells//nBlocks for block in xrange(nBlocks+1)]
+            
+            self.blocks = []
+            for start, stop in zip(edges[:-1], edges[1:]):
+                rows = slice(start, stop)
+                self.blocks.append((rows, finiteVolumeFunctions(self.mesh.rowBlock(rows))))
+            self.pool = ThreadPool(self.threads)
+        
+        return self.blocks
+    
+    def blocked(self, operator, field, out, u=None, flux=None, **arguments):
+        """
+        Evaluate the operator of the given name on every block of rows in the thread pool, writing
+        the rows of out. The ghost cells of field are filled on the whole mesh, and each block takes
+        the values of u from the flux context of the whole mesh.
+        """
+        blocks = self.rowBlocks()
+        
+        if out is None:
+            if operator == "grad":
+                out = self.mesh.volVectorField.copy(order="K")
+            else:
+                out = self.mesh.volScalarField.copy()
+        
+        field = self.mesh.interior(self.halo(field, "block"))
+        
+        # Upwind factors (for grad) or face fluxes (for div), computed here for the whole mesh
+        fluxes = [None]*len(blocks)
+        if operator == "div" or (operator == "grad" and (len(u) > 0 or flux is not None) and arguments["scheme"] != "linear"):
+            flux = self.fluxFor(u, flux)
+            cellFactors = flux.cellFactors() if operator == "grad" else None
+            faceValues = flux.faceValues() if operator == "div" else None
+            fluxes = [fluxBlock(self.mesh, rows, cellFactors, faceValues) for rows, fvc in blocks]
+        
+        def evaluate(block):
+            (rows, fvc), blockFlux = block
+            blockArguments = dict(arguments, out=self.mesh.rowsOf(out, rows))
+            if blockFlux is not None:
+                blockArguments.update(u=self.mesh.rowsOf(u, rows) if len(u) > 0 else u, flux=blockFlux)
+            getattr(fvc, operator)(self.mesh.rowsOf(field, rows), **blockArguments)
+        
+        self.pool.map(evaluate, zip(blocks, fluxes))
+        
+        return out
+    
+    def positiveFactor(self, velocity, out):
+        "1 where the velocity is positive, 0 elsewhere"
+        magU = self.workspace("magU", velocity.shape)
+        np.abs(velocity, out=magU)
+        np.add(velocity, magU, out=out)
+        out *= 0.5
+        np.maximum(magU, self.small, out=magU)
+        out /= magU
+        
+        return out
+    
+    def negativeFactor(self, velocity, out):
+        "1 where the velocity is negative, 0 elsewhere"
+        magU = self.workspace("magU", velocity.shape)
+        np.abs(velocity, out=magU)
+        np.subtract(velocity, magU, out=out)
+        np.abs(out, out=out)
+        out *= 0.5
+        np.maximum(magU, self.small, out=magU)
+        out /= magU
+        
+        return out
+    
+    def weightedSum(self, factor, field1, field2, out):
+        "factor*field1 + (1-factor)*field2"
+        complement = self.workspace("complement", out.shape)
+        np.subtract(1., factor, out=complement)
+        complement *= field2
+        np.multiply(factor, field1, out=out)
+        out += complement
+        
+        return out
+    
+    def gradFaces(self, haloField, name="grad"):
+        "Gradients normal to every x face (nz, nx+1) and z face (nz+1, nx), including both boundaries"
+        gradxFaces = self.workspace(name+"x", self.mesh.xFaceShape)
+        np.subtract(haloField[...,1:-1,1:], haloField[...,1:-1,:-1], out=gradxFaces)
+        gradxFaces /= self.mesh.dx
         
-        gradzField = self.mesh.surfaceScalarField.copy()
-        gradzField[:,:] = (field - np.roll(field, -1, axis=0))/self.mesh.dz
-        if not self.mesh.zPeriodic:
-            gradzField[-1,:] *= 0.
+        gradzFaces = self.workspace(name+"z", self.mesh.zFaceShape)
+        np.subtract(haloField[...,:-1,1:-1], haloField[...,1:,1:-1], out=gradzFaces)
+        gradzFaces /= self.mesh.dz
         
-        return gradxField, gradzField
+        return gradxFaces, gradzFaces
     
-    def grad(self, field, scheme, u=[]):
-        gradField = self.mesh.volVectorField.copy()
-        gradxField, gradzField = self.gradComponents(field)
+    def gradComponents(self, field, out=None):
+        gradxFaces, gradzFaces = self.gradFaces(self.halo(field))
         
-        if scheme == "linear" or u == []:
-            gradField[:,:,0] = 0.5*gradxField + 0.5*np.roll(gradxField, -1, axis=1)
-            gradField[:,:,1] = 0.5*gradzField + 0.5*np.roll(gradzField,  1, axis=0)
+        if out is None:
+            out = (self.mesh.surfaceScalarField.copy(), self.mesh.surfaceScalarField.copy())
+        out[0][...] = gradxFaces[...,:-1]
+        out[1][...] = gradzFaces[...,1:,:]
+        
+        return out
+    
+    def grad(self, field, scheme, u=[], out=None, flux=None):
+        if self.threads is not None and scheme not in tvdLimiters:
+            return self.blocked("grad", field, out, u=u, flux=flux, scheme=scheme)
+        
+        gradField = out
+        if gradField is None:
+            gradField = self.mesh.volVectorField.copy(order="K")
+        gradxFaces, gradzFaces = self.gradFaces(self.halo(field))
+        
+        # Gradients on the faces either side of each cell (zero on walls due to the zero-gradient halo)
+        gradxLeft = gradxFaces[...,:-1]
+        gradxRight = gradxFaces[...,1:]
+        gradzUpper = gradzFaces[...,:-1,:]
+        gradzLower = gradzFaces[...,1:,:]
+        
+        if scheme == "linear" or (len(u) == 0 and flux is None):
+            half = self.workspace("half", gradxLeft.shape)
+            
+            np.multiply(gradxLeft, 0.5, out=gradField[...,0])
+            np.multiply(gradxRight, 0.5, out=half)
+            gradField[...,0] += half
+            
+            np.multiply(gradzLower, 0.5, out=gradField[...,1])
+            np.multiply(gradzUpper, 0.5, out=half)
+            gradField[...,1] += half
         elif scheme == "upwind":
-            ux = u[:,:,0]
-            magUx = np.abs(ux)
-            uxFactor = 0.5*(ux+magUx)/np.maximum(magUx, self.small)
-            gradField[:,:,0] = uxFactor*gradxField + (1.-uxFactor)*np.roll(gradxField, -1, axis=1)
+            xFactor, zFactor = self.fluxFor(u, flux).cellFactors()
             
-            uz = u[:,:,1]
-            magUz = np.abs(uz)
-            uzFactor = 0.5*(uz+magUz)/np.maximum(magUz, self.small)
-            gradField[:,:,1] = uzFactor*gradzField + (1.-uzFactor)*np.roll(gradzField,  1, axis=0)
+            self.weightedSum(xFactor, gradxLeft, gradxRight, gradField[...,0])
+            self.weightedSum(zFactor, gradzLower, gradzUpper, gradField[...,1])
+        elif scheme in tvdLimiters:
+            # Difference of the limited face values either side of each cell, with both faces
+            # reconstructed from the upwind side of the cell (as for the upwind scheme)
+            xFactor, zFactor = self.fluxFor(u, flux).cellFactors()
+            haloField = self.halo(field)
             
-        gradField[0,:,1] = 0
-        gradField[-1,:,1] = 0
+            gradients = []
+            for faceFactor, direction in [(0., "Positive"), (1., "Negative")]:
+                xFaces, zFaces = self.interpolateTVDFaces(haloField, faceFactor, faceFactor, scheme, name="tvd"+direction)
+                gradx = self.workspace("tvdGradx"+direction, gradxLeft.shape)
+                np.subtract(xFaces[...,1:], xFaces[...,:-1], out=gradx)
+                gradx /= self.mesh.dx
+                gradz = self.workspace("tvdGradz"+direction, gradxLeft.shape)
+                np.subtract(zFaces[...,:-1,:], zFaces[...,1:,:], out=gradz)
+                gradz /= self.mesh.dz
+                gradients.append((gradx, gradz))
+            
+            # Face factor 0 is flow in the +x (upwards) direction, where the cell factor is 1
+            self.weightedSum(xFactor, gradients[0][0], gradients[1][0], gradField[...,0])
+            self.weightedSum(zFactor, gradients[0][1], gradients[1][1], gradField[...,1])
+            
+        if self.mesh.topBoundary != "interface":
+            gradField[...,0,:,1] = 0
+        if self.mesh.bottomBoundary != "interface":
+            gradField[...,-1,:,1] = 0
         
         return gradField
     
-    def uDotGradU(self, u, scheme):
-        uGradU = self.mesh.volVectorField.copy()
+    def uDotGradU(self, u, scheme, out=None, flux=None):
+        uGradU = out
+        if uGradU is None:
+            uGradU = self.mesh.volVectorField.copy(order="K")
+        
+        ux = u[...,0]
+        uz = u[...,1]
         
-        ux = u[:,:,0]
-        uz = u[:,:,1]
+        # Both components share the same upwind factors
+        flux = self.fluxFor(u, flux)
         
-        gradUx = self.grad(ux, scheme, u=u)
-        gradUz = self.grad(uz, scheme, u=u)
+        gradUx = self.grad(ux, scheme, u=u, out=self.workspace("gradUx", u.shape, like=u), flux=flux)
+        gradUz = self.grad(uz, scheme, u=u, out=self.workspace("gradUz", u.shape, like=u), flux=flux)
         
-        uGradU[:,:,0] = dot(u, gradUx)
-        uGradU[:,:,1] = dot(u, gradUz)
+        dot(u, gradUx, out=uGradU[...,0])
+        dot(u, gradUz, out=uGradU[...,1])
         
         return uGradU
+    
+    def interpolateLinearFaces(self, haloField, name="face"):
+        "Linear interpolation onto every x face (nz, nx+1) and z face (nz+1, nx)"
+        xFaces = self.workspace(name+"x", self.mesh.xFaceShape)
+        np.add(haloField[...,1:-1,1:], haloField[...,1:-1,:-1], out=xFaces)
+        xFaces *= 0.5
         
-    def interpolateLinear(self, field):
-        xField = self.mesh.surfaceScalarField.copy()
-        xField[:,:] = 0.5*(field + np.roll(field, 1, axis=1))
-        # if not self.mesh.xPeriodic:
-            # xField[:,0] *= 0.
+        zFaces = self.workspace(name+"z", self.mesh.zFaceShape)
+        np.add(haloField[...,:-1,1:-1], haloField[...,1:,1:-1], out=zFaces)
+        zFaces *= 0.5
         
-        zField = self.mesh.surfaceScalarField.copy()
-        zField[:,:] = 0.5*(field + np.roll(field, -1, axis=0))
-        # if not self.mesh.zPeriodic:
-            # zField[-1,:] *= 0.
+        return xFaces, zFaces
+    
+    def interpolateUpwindFaces(self, haloField, xFactor, zFactor, name="face"):
+        "Upwind interpolation onto every x face (nz, nx+1) and z face (nz+1, nx), see fluxContext"
+        xFaces = self.workspace(name+"x", self.mesh.xFaceShape)
+        self.weightedSum(xFactor, haloField[...,1:-1,1:], haloField[...,1:-1,:-1], xFaces)
         
-        return xField, zField
+        zFaces = self.workspace(name+"z", self.mesh.zFaceShape)
+        self.weightedSum(zFactor, haloField[...,:-1,1:-1], haloField[...,1:,1:-1], zFaces)
         
-    def interpolateUpwind(self, field, u):
+        return xFaces, zFaces
+    
+    def limitFaces(self, faces, factor, difference, upwindDifference0, upwindDifference1, limiter):
+        """
+        Add 0.5*psi(r)*(downwind - upwind) to the upwind values on faces. difference is the change
+        across each face in the direction of its axis; factor is 0 where the flow is in that
+        direction, with upwindDifference0 the change across the upwind faces, and 1 where it is
+        against it, with upwindDifference1.
+        """
+        upwindDifference = (1. - factor)*upwindDifference0 - factor*upwindDifference1
+        faceDifference = (1. - 2.*factor)*difference
+        
+        denominator = np.where(np.abs(faceDifference) > self.small, faceDifference, self.small)
+        faces += 0.5*tvdLimiters[limiter](upwindDifference/denominator)*faceDifference
+        
+        return faces
+    
+    def interpolateTVDFaces(self, haloField, xFactor, zFactor, limiter, name="face"):
+        """
+        Upwind interpolation onto every x face (nz, nx+1) and z face (nz+1, nx) with the limited
+        second order correction of a TVD scheme (see tvdLimiters). The upwind difference beyond
+        the halo is taken from the other side of periodic boundaries and is zero at walls and
+        interfaces, where the schemes fall back to upwind.
+        """
+        xFaces, zFaces = self.interpolateUpwindFaces(haloField, xFactor, zFactor, name)
+        
+        # Changes across the faces in the x direction, with one more face beyond each end
+        xDifference = self.workspace(name+"xDifference", xFaces.shape[:-1] + (xFaces.shape[-1]+2,))
+        np.subtract(haloField[...,1:-1,1:], haloField[...,1:-1,:-1], out=xDifference[...,1:-1])
+        if self.mesh.xPeriodic:
+            xDifference[...,0] = xDifference[...,-3]
+            xDifference[...,-1] = xDifference[...,2]
+        else:
+            xDifference[...,0] = 0.
+            xDifference[...,-1] = 0.
+        
+        self.limitFaces(
+            xFaces, xFactor, xDifference[...,1:-1], xDifference[...,:-2], xDifference[...,2:], limiter
+        )
+        
+        # Changes across the faces upwards (towards lower row indices), with one more face beyond each end
+        zDifference = self.workspace(name+"zDifference", zFaces.shape[:-2] + (zFaces.shape[-2]+2, zFaces.shape[-1]))
+        np.subtract(haloField[...,:-1,1:-1], haloField[...,1:,1:-1], out=zDifference[...,1:-1,:])
+        if self.mesh.zPeriodic:
+            zDifference[...,0,:] = zDifference[...,-3,:]
+            zDifference[...,-1,:] = zDifference[...,2,:]
+        else:
+            zDifference[...,0,:] = 0.
+            zDifference[...,-1,:] = 0.
         
-        ux = u[:,:,0]
-        magUx = np.abs(ux)
-        uxFactor = 0.5*np.abs(ux-magUx)/np.maximum(magUx, self.small)
+        self.limitFaces(
+            zFaces, zFactor, zDifference[...,1:-1,:], zDifference[...,2:,:], zDifference[...,:-2,:], limiter
+        )
         
-        xField = self.mesh.surfaceScalarField.copy()
-        xField[:,:] = uxFactor*field + (1.-uxFactor)*np.roll(field, 1, axis=1)
-        # if not self.mesh.xPeriodic:
-            # xField[:,0] *= 0.
+        return xFaces, zFaces
+    
+    def interpolateLinear(self, field):
+        xFaces, zFaces = self.interpolateLinearFaces(self.halo(field))
         
-        uz = u[:,:,1]
-        magUz = np.abs(uz)
-        uzFactor = 0.5*np.abs(uz-magUz)/np.maximum(magUz, self.small)
+        return xFaces[...,:-1].copy(), zFaces[...,1:,:].copy()
         
-        zField = self.mesh.surfaceScalarField.copy()
-        zField[:,:] = uzFactor*field + (1.-uzFactor)*np.roll(field, -1, axis=0)
-        # if not self.mesh.zPeriodic:
-            # zField[-1,:] *= 0.
+    def interpolateUpwind(self, field, u, flux=None, scheme="upwind"):
+        "Upwind face values, or those of a TVD scheme (see tvdLimiters) named by scheme"
+        xFactor, zFactor = self.fluxFor(u, flux).faceValues()[:2]
+        if scheme in tvdLimiters:
+            xFaces, zFaces = self.interpolateTVDFaces(self.halo(field), xFactor, zFactor, scheme)
+        else:
+            xFaces, zFaces = self.interpolateUpwindFaces(self.halo(field), xFactor, zFactor)
         
-        return xField, zField
+        return xFaces[...,:-1].copy(), zFaces[...,1:,:].copy()
     
-    def div(self, field, u, scheme):
-        "Calculate the divergence in a cell as the some of fluxes over all faces (Gauss' law)"
+    def faceFluxes(self, field, u, scheme, flux=None):
+        """
+        Fluxes of field through every x face (nz, nx+1) and z face (nz+1, nx), divided by the cell
+        volume and zero on walls. These are the fluxes summed by div, in reused scratch arrays.
+        """
+        xFactor, zFactor, phix, phiz = self.fluxFor(u, flux).faceValues()
+        
+        haloField = self.halo(field)
         
         if scheme == "upwind":
-            fieldFacex, fieldFacez = self.interpolateUpwind(field, u)
+            fieldFacex, fieldFacez = self.interpolateUpwindFaces(haloField, xFactor, zFactor)
+        elif scheme in tvdLimiters:
+            fieldFacex, fieldFacez = self.interpolateTVDFaces(haloField, xFactor, zFactor, scheme)
         else:
-            fieldFacex, fieldFacez = self.interpolateLinear(field)
-        
-        uxFacex, uxFacez = self.interpolateLinear(u[:,:,0])
-        uzFacex, uzFacez = self.interpolateLinear(u[:,:,1])
-        
-        uFacex = u.copy()
-        uFacex[:,:,0] = uxFacex
-        uFacex[:,:,1] = uzFacex
+            fieldFacex, fieldFacez = self.interpolateLinearFaces(haloField)
         
-        uFacez = u.copy()
-        uFacez[:,:,0] = uxFacez
-        uFacez[:,:,1] = uzFacez
+        cellVolume = self.mesh.dx*self.mesh.dy*self.mesh.dz
         
-        fluxx = fieldFacex*dot(uFacex, self.mesh.xSf)/self.mesh.cellVolume
+        fluxx = self.workspace("fluxx", phix.shape)
+        np.multiply(fieldFacex, phix, out=fluxx)
+        fluxx /= cellVolume
         if not self.mesh.xPeriodic:
-            fluxx[:,0] *= 0.
+            fluxx[...,0] = 0.
+            fluxx[...,-1] = 0.
+        
+        fluxz = self.workspace("fluxz", phiz.shape)
+        np.multiply(fieldFacez, phiz, out=fluxz)
+        fluxz /= cellVolume
+        if self.mesh.topBoundary == "wall":
+            fluxz[...,0,:] = 0.
+        if self.mesh.bottomBoundary == "wall":
+            fluxz[...,-1,:] = 0.
+        
+        return fluxx, fluxz
+    
+    def div(self, field, u, scheme, out=None, flux=None):
+        "Calculate the divergence in a cell as the some of fluxes over all faces (Gauss' law)"
+        if self.threads is not None and scheme not in tvdLimiters:
+            return self.blocked("div", field, out, u=u, flux=flux, scheme=scheme)
         
-        fluxz = fieldFacez*dot(uFacez, self.mesh.zSf)/self.mesh.cellVolume
-        if not self.mesh.zPeriodic:
-            fluxz[-1,:] *= 0.
+        fluxx, fluxz = self.faceFluxes(field, u, scheme, flux=flux)
         
-        divergence = self.mesh.volScalarField.copy()
-        divergence += np.roll(fluxx, -1, axis=1) - fluxx
-        divergence += np.roll(fluxz,  1, axis=0) - fluxz
+        divergence = out
+        if divergence is None:
+            divergence = self.mesh.volScalarField.copy()
+        netFluxz = self.workspace("netFlux", divergence.shape)
+        np.subtract(fluxx[...,1:], fluxx[...,:-1], out=divergence)
+        np.subtract(fluxz[...,:-1,:], fluxz[...,1:,:], out=netFluxz)
+        divergence += netFluxz
         
         return divergence
     
-    def laplacian(self, field):
-        laplacianFieldx = self.mesh.volScalarField.copy()
-        laplacianFieldx = (np.roll(field, -1, axis=1) - 2*field + np.roll(field, 1, axis=1))/(2*self.mesh.dx)**2
+    def laplacian(self, field, out=None):
+        if self.threads is not None:
+            return self.blocked("laplacian", field, out)
+        
+        haloField = self.halo(field)
+        cells = haloField[...,1:-1,1:-1]
+        
+        laplacianFieldx = self.workspace("laplacianx", cells.shape)
+        np.multiply(cells, 2, out=laplacianFieldx)
+        np.subtract(haloField[...,1:-1,2:], laplacianFieldx, out=laplacianFieldx)
+        laplacianFieldx += haloField[...,1:-1,:-2]
         if not self.mesh.xPeriodic:
-            laplacianFieldx[:,0] = (np.roll(field, -1, axis=1) - field)[:,0]/(2*self.mesh.dx)**2
-            laplacianFieldx[:,-1] = (np.roll(field, 1, axis=1) - field)[:,-1]/(2*self.mesh.dx)**2
+            np.subtract(haloField[...,1:-1,2], cells[...,0], out=laplacianFieldx[...,0])
+            np.subtract(haloField[...,1:-1,-3], cells[...,-1], out=laplacianFieldx[...,-1])
+        laplacianFieldx /= (2*self.mesh.dx)**2
+        
+        laplacianFieldz = self.workspace("laplacianz", cells.shape)
+        np.multiply(cells, 2, out=laplacianFieldz)
+        np.subtract(haloField[...,2:,1:-1], laplacianFieldz, out=laplacianFieldz)
+        laplacianFieldz += haloField[...,:-2,1:-1]
+        if self.mesh.topBoundary == "wall":
+            np.subtract(haloField[...,2,1:-1], cells[...,0,:], out=laplacianFieldz[...,0,:])
+        if self.mesh.bottomBoundary == "wall":
+            np.subtract(haloField[...,-3,1:-1], cells[...,-1,:], out=laplacianFieldz[...,-1,:])
+        laplacianFieldz /= (2*self.mesh.dz)**2
+        
+        laplacianField = out
+        if laplacianField is None:
+            laplacianField = self.mesh.volScalarField.copy()
+        np.add(laplacianFieldx, laplacianFieldz, out=laplacianField)
+        
+        return laplacianField
+    
+    
+    def meshSignature(self):
+        "Parameters which define the discrete operators, used to validate cached matrices"
+        return (
+            self.mesh.xNCells, self.mesh.zNCells, self.mesh.dx, self.mesh.dz, 
+            self.mesh.xPeriodic, self.mesh.zPeriodic, self.mesh.dtype
+        )
+    
+    def laplacianMatrix(self):
+        "Assemble the 5-point Laplacian on the mesh as a sparse (CSR) matrix"
+        lengthX = self.mesh.xNCells
+        lengthZ = self.mesh.zNCells
+        matrixLength = lengthX*lengthZ
+        
+        index = np.arange(matrixLength).reshape(lengthZ, lengthX)
+        
+        rows = []
+        columns = []
+        values = []
+        diagonal = np.zeros((lengthZ, lengthX), dtype=self.mesh.dtype)
+        
+        neighbours = [
+            (np.roll(index,  1, axis=1), self.mesh.xPeriodic, (slice(None), 0),  1./self.mesh.dx**2),
+            (np.roll(index, -1, axis=1), self.mesh.xPeriodic, (slice(None), -1), 1./self.mesh.dx**2),
+            (np.roll(index,  1, axis=0), self.mesh.zPeriodic, (0, slice(None)),  1./self.mesh.dz**2),
+            (np.roll(index, -1, axis=0), self.mesh.zPeriodic, (-1, slice(None)), 1./self.mesh.dz**2)
+        ]
+        
+        for neighbour, periodic, boundary, coefficient in neighbours:
+            # Zero-gradient walls simply remove the connection across the boundary
+            connected = np.ones((lengthZ, lengthX), dtype=bool)
+            if not periodic:
+                connected[boundary] = False
+            
+            rows.append(index[connected])
+            columns.append(neighbour[connected])
+            values.append(np.zeros(connected.sum(), dtype=self.mesh.dtype) + coefficient)
+            diagonal[connected] -= coefficient
+        
+        rows.append(index.flatten())
+        columns.append(index.flatten())
+        values.append(diagonal.flatten())
         
-        laplacianFieldz = self.mesh.volScalarField.copy()
-        laplacianFieldz = (np.roll(field, -1, axis=0) - 2*field + np.roll(field, 1, axis=0))/(2*self.mesh.dz)**2
-        if not self.mesh.zPeriodic:
-            laplacianFieldz[0,:] = (np.roll(field, -1, axis=0) - field)[0,:]/(2*self.mesh.dz)**2
-            laplacianFieldz[-1,:] = (np.roll(field, 1, axis=0) - field)[-1,:]/(2*self.mesh.dz)**2
+        matrix = sparse.coo_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))), 
+            shape=(matrixLength, matrixLength)
+        )
         
-        return laplacianFieldx + laplacianFieldz
+        return matrix.tocsr()
     
+    def poissonBackend(self, method):
+        "Fetch the cached Poisson solver object for the given method"
+        signature = self.meshSignature()
+        if method not in self.poissonBackends or self.poissonBackends[method][0] != signature:
+            if method == "multigrid":
+                # Ensemble members are solved one at a time, on the mesh of a single member
+                from .multigrid import multigridSolver
+                backend = multigridSolver(self.mesh.member())
+            elif method == "spectral":
+                from .spectralPoisson import spectralPoissonSolver
+                backend = spectralPoissonSolver(self.mesh)
+            else:
+                raise ValueError("Unknown Poisson solver method: {}".format(method))
+            self.poissonBackends[method] = (signature, backend)
+        
+        return self.poissonBackends[method][1]
     
-    def poissonSolver(self, field, solution):
-        matrixLength = len(field.flatten())
-        matrixToInvert = np.zeros((matrixLength, matrixLength))
+    def poissonSolver(self, field, solution, method="direct"):
+        """
+        Solve laplacian(field) = solution for field. The boundaries are periodic or zero-gradient, 
+        so the solution is only defined up to a constant and the zero-mean solution is returned.
+        The "direct" method caches the sparse LU factorisation for as long as the mesh is unchanged.
+        The "multigrid" method uses field as the initial guess, see multigridSolver.
+        The "spectral" method uses FFTs/DCTs, see spectralPoissonSolver.
+        Fields with an ensemble axis (see cubeMesh2D) are solved for every member.
+        """
+        ensembleShape = self.mesh.ensembleShape
+        
+        signature = self.meshSignature()
+        
+        if method == "multigrid" and ensembleShape != ():
+            fieldNew = self.mesh.volScalarField.copy()
+            for member in np.ndindex(*ensembleShape):
+                fieldNew[member] = self.poissonBackend(method).poissonSolver(field[member], solution[member])
+            return fieldNew
+        
+        if method != "direct":
+            return self.poissonBackend(method).poissonSolver(field, solution)
+        
+        if self.poissonFactorisation is None or self.poissonSignature != signature:
+            matrix = self.laplacianMatrix().tolil()
+            
+            # Fix the undetermined constant by pinning the first cell
+            matrix[0,:] = 0.
+            matrix[0,0] = 1.
+            
+            self.poissonFactorisation = sparseLinalg.factorized(matrix.tocsc())
+            self.poissonSignature = signature
         
-        lengthX = len(field[0])
-        lengthZ = len(field)
-        for k in xrange(lengthZ):
-            for i in xrange(lengthX):
-                index = k*lengthX + i
-                matrixToInvert[index][index] -= 4.
-                matrixToInvert[index][index-1] += 1.
-                matrixToInvert[index][(index+1)%matrixLength] += 1.
-                matrixToInvert[index][index-lengthX] += 1.
-                matrixToInvert[index][(index+lengthX)%matrixLength] += 1.
+        # Remove the incompatible (non-zero mean) part of the source term
+        source = np.reshape(solution, ensembleShape+(-1,)) - solution.mean(axis=(-2,-1))[...,None]
+        source[...,0] = 0.
         
-        if not self.mesh.xPeriodic:
-            for k in xrange(lengthZ):
-                i = 0
-                index = k*lengthX + i
-                matrixToInvert[index][index] += 1.
-                matrixToInvert[index][index-1] -= 1.
-                
-                i = lengthX-1
-                index = k*lengthX + i
-                matrixToInvert[index][index] += 1.
-                matrixToInvert[index][(index+1)%matrixLength] -= 1.
-        
-        if not self.mesh.zPeriodic:
-            for i in xrange(lengthX):
-                k = 0
-                index = k*lengthX + i
-                matrixToInvert[index][index] += 1.
-                matrixToInvert[index][index-lengthX] -= 1.
-                
-                k = lengthZ-1
-                index = k*lengthX + i
-                matrixToInvert[index][index] += 1.
-                matrixToInvert[index][(index+lengthX)%matrixLength] -= 1.
-                
-        # print matrixToInvert
-        matrixToInvert *= 1./self.mesh.dx**2
-        
-        matrixInverted = np.linalg.inv(matrixToInvert)
-        
-        fieldNew = np.dot(matrixInverted, solution.flatten())
-        
-        fieldNew2D = np.reshape(fieldNew, (-1, lengthX))
+        # Ensemble members are solved together, as the columns of the right hand side
+        fieldNew = self.poissonFactorisation(source.T).T
+        fieldNew -= fieldNew.mean(axis=-1)[...,None]
+        
+        fieldNew2D = np.reshape(fieldNew, self.mesh.volScalarField.shape)
         
         return fieldNew2D
     
     def setBoundaryConditions(self, field):
         "Enforce boundary conditions where necessary"
         
+        cells = self.mesh.planes(field)
+        
         if not self.mesh.xPeriodic:
-            field[:,0] = field[:,1]
-            field[:,-1] = field[:,-2]
+            cells[...,0] = cells[...,1]
+            cells[...,-1] = cells[...,-2]
         
-        if not self.mesh.zPeriodic:
-            field[0,:] = field[1,:]
-            field[-1,:] = field[-2,:]
+        if self.mesh.topBoundary == "wall":
+            cells[...,0,:] = cells[...,1,:]
+        if self.mesh.bottomBoundary == "wall":
+            cells[...,-1,:] = cells[...,-2,:]
         
         return field
\ No newline at end of file
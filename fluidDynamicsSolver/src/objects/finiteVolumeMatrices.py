@@ -0,0 +1,151 @@
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as sparseLinalg
+from .finiteVolumeCalculations import finiteVolumeFunctions, tvdLimiters
+
+class finiteVolumeMatrices:
+    """
+    Implicit counterpart of finiteVolumeFunctions (OpenFOAM's fvm namespace): assembles operators
+    as sparse matrices acting on the flattened cell field. Every operator shares one 5-point
+    sparsity pattern (cell, west, east, upper and lower neighbours, with zero coefficients across
+    walls), which is built once, so each step only the coefficients are recomputed. Coefficients
+    of several terms can be summed before building a single matrix with matrix().
+    """
+    def __init__(self, mesh, fvc=None):
+        self.mesh = mesh
+        if mesh.ensembleShape != ():
+            raise ValueError("Matrix assembly for an ensemble mesh is not supported, use mesh.member()")
+        if fvc is None:
+            fvc = finiteVolumeFunctions(mesh)
+        self.fvc = fvc
+        
+        xNCells = mesh.xNCells
+        zNCells = mesh.zNCells
+        self.shape = (xNCells*zNCells, xNCells*zNCells)
+        
+        index = np.arange(xNCells*zNCells).reshape(zNCells, xNCells)
+        neighbours = np.stack([
+            index,
+            np.roll(index,  1, axis=1),
+            np.roll(index, -1, axis=1),
+            np.roll(index,  1, axis=0),
+            np.roll(index, -1, axis=0)
+        ], axis=-1)
+        
+        # Compressed sparse row pattern with 5 entries per row
+        self.indices = neighbours.flatten()
+        self.indptr = np.arange(0, 5*xNCells*zNCells+1, 5)
+    
+    def coefficients(self):
+        "Empty coefficient array, the last axis is (cell, west, east, upper, lower)"
+        return np.zeros((self.mesh.zNCells, self.mesh.xNCells, 5), dtype=self.mesh.dtype)
+    
+    def matrix(self, coefficients):
+        "Sparse (CSR) matrix for an array of coefficients, reusing the cached sparsity pattern"
+        return sparse.csr_matrix((coefficients.flatten(), self.indices, self.indptr), shape=self.shape)
+    
+    def faceValues(self, field):
+        "Linear interpolation of a scalar (or cell field) onto all x faces (nz, nx+1) and z faces (nz+1, nx)"
+        if np.isscalar(field):
+            xFaces = np.zeros((self.mesh.zNCells, self.mesh.xNCells+1), dtype=self.mesh.dtype) + field
+            zFaces = np.zeros((self.mesh.zNCells+1, self.mesh.xNCells), dtype=self.mesh.dtype) + field
+            return xFaces, zFaces
+        
+        xFaces, zFaces = self.fvc.interpolateLinearFaces(self.fvc.halo(field))
+        return xFaces.copy(), zFaces.copy()
+    
+    def zeroWallFaces(self, xFaces, zFaces):
+        if not self.mesh.xPeriodic:
+            xFaces[:,0] = 0.
+            xFaces[:,-1] = 0.
+        
+        if not self.mesh.zPeriodic:
+            zFaces[0,:] = 0.
+            zFaces[-1,:] = 0.
+    
+    def laplacianCoefficients(self, gamma=1.):
+        """
+        Coefficients of div(gamma*grad(field)) with zero-gradient walls, i.e. the 5-point operator
+        used by the Poisson solvers (finiteVolumeFunctions.laplacianMatrix when gamma = 1).
+        """
+        gammax, gammaz = self.faceValues(gamma)
+        self.zeroWallFaces(gammax, gammaz)
+        gammax /= self.mesh.dx**2
+        gammaz /= self.mesh.dz**2
+        
+        coefficients = self.coefficients()
+        coefficients[:,:,1] = gammax[:,:-1]
+        coefficients[:,:,2] = gammax[:,1:]
+        coefficients[:,:,3] = gammaz[:-1,:]
+        coefficients[:,:,4] = gammaz[1:,:]
+        coefficients[:,:,0] = -coefficients[:,:,1:].sum(axis=-1)
+        
+        return coefficients
+    
+    def divCoefficients(self, u, scheme, flux=None):
+        """
+        Coefficients of div(field*u), discretised as in finiteVolumeFunctions.div. The limited
+        correction of the TVD schemes is nonlinear, so they are assembled as upwind; the correction
+        can be added explicitly with finiteVolumeFunctions (deferred correction).
+        """
+        xFactor, zFactor, phix, phiz = self.fvc.fluxFor(u, flux).faceValues()
+        
+        cellVolume = self.mesh.dx*self.mesh.dy*self.mesh.dz
+        fluxx = phix/cellVolume
+        fluxz = phiz/cellVolume
+        self.zeroWallFaces(fluxx, fluxz)
+        
+        # Weight of the cell on the +x side (x faces) or upper side (z faces) of each face
+        if scheme == "upwind" or scheme in tvdLimiters:
+            xWeight = xFactor
+            zWeight = zFactor
+        else:
+            xWeight = 0.5 + 0.*fluxx
+            zWeight = 0.5 + 0.*fluxz
+        
+        left = (slice(None), slice(None,-1))
+        right = (slice(None), slice(1,None))
+        upper = (slice(None,-1), slice(None))
+        lower = (slice(1,None), slice(None))
+        
+        coefficients = self.coefficients()
+        coefficients[:,:,2] = fluxx[right]*xWeight[right]
+        coefficients[:,:,1] = -fluxx[left]*(1.-xWeight[left])
+        coefficients[:,:,0] = fluxx[right]*(1.-xWeight[right]) - fluxx[left]*xWeight[left]
+        
+        coefficients[:,:,3] = fluxz[upper]*zWeight[upper]
+        coefficients[:,:,4] = -fluxz[lower]*(1.-zWeight[lower])
+        coefficients[:,:,0] += fluxz[upper]*(1.-zWeight[upper]) - fluxz[lower]*zWeight[lower]
+        
+        return coefficients
+    
+    def ddtCoefficients(self, dt, coefficient=1.):
+        "Coefficients of the implicit Euler time derivative, coefficient*field/dt"
+        coefficients = self.coefficients()
+        coefficients[:,:,0] = coefficient/dt
+        
+        return coefficients
+    
+    def laplacian(self, gamma=1.):
+        return self.matrix(self.laplacianCoefficients(gamma))
+    
+    def div(self, u, scheme, flux=None):
+        return self.matrix(self.divCoefficients(u, scheme, flux))
+    
+    def ddt(self, dt, coefficient=1.):
+        return self.matrix(self.ddtCoefficients(dt, coefficient))
+    
+    def solve(self, matrix, source, method="direct", initialGuess=None, tolerance=1e-10):
+        "Solve matrix*field = source for a cell field, directly or with BiCGSTAB"
+        if method == "direct":
+            solution = sparseLinalg.spsolve(matrix.tocsc(), source.flatten())
+        elif method == "bicgstab":
+            if initialGuess is not None:
+                initialGuess = initialGuess.flatten()
+            solution, info = sparseLinalg.bicgstab(matrix, source.flatten(), x0=initialGuess, tol=tolerance)
+            if info != 0:
+                raise RuntimeError("BiCGSTAB did not converge (info={})".format(info))
+        else:
+            raise ValueError("Unknown matrix solver method: {}".format(method))
+        
+        return np.reshape(solution, (self.mesh.zNCells, self.mesh.xNCells))
\ No newline at end of file
@@ -0,0 +1,126 @@
+import numpy as np
+
+class fluxContext:
+    """
+    Face velocities, face fluxes phi = dot(uFace, Sf) and upwind factors of a velocity field u, shared
+    between finiteVolumeFunctions operators (see the flux argument of grad, div and uDotGradU).
+    Each group of values is computed on first use. While track is True the values in u are
+    compared with those used for the last computation, and everything is recomputed once u changes.
+    For u stored with a halo the ghost cells are compared too, which picks up halo values
+    exchanged between the sub-domains of a domainDecomposition.
+    """
+    def __init__(self, fvc, u, track=True):
+        self.fvc = fvc
+        self.mesh = fvc.mesh
+        self.track = track
+        self.setVelocity(u)
+        
+        # Copy of u (with its halo) for the current values, to detect changes
+        self.uComputed = np.empty_like(self.uTracked)
+        self.changed = np.empty_like(self.uTracked, dtype=bool)
+        
+        # Upwind factors at cell centres, 1 where the velocity component is positive
+        self.xCellFactor = np.empty(self.mesh.volScalarField.shape, dtype=self.mesh.dtype)
+        self.zCellFactor = np.empty(self.mesh.volScalarField.shape, dtype=self.mesh.dtype)
+        
+        # Upwind factors on all x faces (nz, nx+1) and z faces (nz+1, nx), 1 where the
+        # flow comes from the cell on the +x side or the upper cell respectively
+        self.xFaceFactor = np.empty(self.mesh.xFaceShape, dtype=self.mesh.dtype)
+        self.zFaceFactor = np.empty(self.mesh.zFaceShape, dtype=self.mesh.dtype)
+        
+        # Face-normal velocities and fluxes on all faces
+        self.uxFace = np.empty(self.mesh.xFaceShape, dtype=self.mesh.dtype)
+        self.uzFace = np.empty(self.mesh.zFaceShape, dtype=self.mesh.dtype)
+        self.phix = np.empty(self.mesh.xFaceShape, dtype=self.mesh.dtype)
+        self.phiz = np.empty(self.mesh.zFaceShape, dtype=self.mesh.dtype)
+        
+        self.invalidate()
+    
+    def invalidate(self):
+        self.cellFactorsValid = False
+        self.faceValuesValid = False
+    
+    def setVelocity(self, u):
+        self.u = u
+        self.uHalo = self.mesh.haloOf(u)
+        self.uTracked = u if self.uHalo is None else self.uHalo
+    
+    def reset(self, u):
+        "Point the context at a new velocity field"
+        self.setVelocity(u)
+        if self.track and self.uComputed.shape != self.uTracked.shape:
+            self.uComputed = np.empty_like(self.uTracked)
+            self.changed = np.empty_like(self.uTracked, dtype=bool)
+        self.invalidate()
+    
+    def check(self):
+        "Invalidate the stored values if u has changed since they were computed"
+        if not self.track:
+            return
+        
+        if self.uHalo is not None:
+            self.mesh.fillHalo(self.uHalo)
+        
+        if self.cellFactorsValid or self.faceValuesValid:
+            np.not_equal(self.uTracked, self.uComputed, out=self.changed)
+            if not self.changed.any():
+                return
+            self.invalidate()
+        
+        self.uComputed[...] = self.uTracked
+    
+    def cellFactors(self):
+        self.check()
+        if not self.cellFactorsValid:
+            self.fvc.positiveFactor(self.u[...,0], self.xCellFactor)
+            self.fvc.positiveFactor(self.u[...,1], self.zCellFactor)
+            self.cellFactorsValid = True
+        
+        return self.xCellFactor, self.zCellFactor
+    
+    def faceValues(self):
+        self.check()
+        if not self.faceValuesValid:
+            haloUx = self.fvc.halo(self.u[...,0], "ux")
+            haloUz = self.fvc.halo(self.u[...,1], "uz")
+            
+            self.fvc.negativeFactor(haloUx[...,1:-1,1:], self.xFaceFactor)
+            self.fvc.negativeFactor(haloUz[...,:-1,1:-1], self.zFaceFactor)
+            
+            np.add(haloUx[...,1:-1,1:], haloUx[...,1:-1,:-1], out=self.uxFace)
+            self.uxFace *= 0.5
+            np.add(haloUz[...,:-1,1:-1], haloUz[...,1:,1:-1], out=self.uzFace)
+            self.uzFace *= 0.5
+            
+            # Only the face-normal velocity contributes to the flux through a face
+            np.multiply(self.uxFace, self.mesh.dy*self.mesh.dz, out=self.phix)
+            np.multiply(self.uzFace, self.mesh.dx*self.mesh.dy, out=self.phiz)
+            
+            self.faceValuesValid = True
+        
+        return self.xFaceFactor, self.zFaceFactor, self.phix, self.phiz
+
+class fluxBlock:
+    """
+    Upwind factors at cells (cellFactors) or face values (faceValues) of a fluxContext on a block of
+    rows of a mesh, for the operators of its rowBlock (see finiteVolumeFunctions.blocked)
+    """
+    def __init__(self, mesh, rows, cellFactors=None, faceValues=None):
+        faceRows = slice(rows.start, rows.stop+1)
+        
+        if cellFactors is not None:
+            xCellFactor, zCellFactor = cellFactors
+            self.cellValues = (mesh.rowsOf(xCellFactor, rows), mesh.rowsOf(zCellFactor, rows))
+        
+        if faceValues is not None:
+            xFaceFactor, zFaceFactor, phix, phiz = faceValues
+            self.faceValueRows = (
+                mesh.rowsOf(xFaceFactor, rows), mesh.rowsOf(zFaceFactor, faceRows),
+                mesh.rowsOf(phix, rows), mesh.rowsOf(phiz, faceRows)
+            )
+    
+    def cellFactors(self):
+        return self.cellValues
+    
+    def faceValues(self):
+        return self.faceValueRows
\ No newline at end of file
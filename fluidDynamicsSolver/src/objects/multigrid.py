@@ -0,0 +1,148 @@
+import numpy as np
+from .cubeMesh2D import cubeMesh2D
+from .finiteVolumeCalculations import finiteVolumeFunctions
+
+class multigridLevel:
+    def __init__(self, mesh):
+        self.mesh = mesh
+        
+        self.cx = 1./mesh.dx**2
+        self.cz = 1./mesh.dz**2
+        
+        #Solution stored with one layer of ghost cells, so stencils are slices of a single array
+        self.padded = mesh.haloScalarField.copy()
+        self.field = mesh.interior(self.padded)
+        self.source = np.zeros((mesh.zNCells, mesh.xNCells), dtype=mesh.dtype)
+        
+        #Chequerboard masks for red-black Gauss-Seidel
+        k, i = np.indices((mesh.zNCells, mesh.xNCells))
+        self.red = (k+i)%2 == 0
+        self.black = ~self.red
+    
+    def neighbourSum(self):
+        padded = self.mesh.fillHalo(self.padded)
+        return self.cx*(padded[1:-1,2:] + padded[1:-1,:-2]) + self.cz*(padded[2:,1:-1] + padded[:-2,1:-1])
+    
+    def laplacian(self):
+        return self.neighbourSum() - 2.*(self.cx + self.cz)*self.field
+    
+    def residual(self):
+        return self.source - self.laplacian()
+    
+    def smooth(self, sweeps):
+        "Red-black Gauss-Seidel sweeps"
+        diagonal = 2.*(self.cx + self.cz)
+        for sweep in xrange(sweeps):
+            for colour in (self.red, self.black):
+                update = (self.neighbourSum() - self.source)/diagonal
+                self.field[colour] = update[colour]
+
+class multigridSolver:
+    """
+    Geometric multigrid solver for laplacian(field) = solution on a cubeMesh2D, with the same
+    periodic/zero-gradient boundaries as finiteVolumeFunctions.poissonSolver. Coarse meshes are
+    made by halving xNCells and zNCells until either becomes odd or reaches coarsestCells, where
+    the sparse direct solver is used.
+    """
+    def __init__(
+        self, mesh,
+        cycle="V",
+        preSmoothing=2,
+        postSmoothing=2,
+        tolerance=1e-8,
+        maxCycles=50,
+        coarsestCells=8
+    ):
+        self.mesh = mesh
+        self.cycle = cycle
+        self.preSmoothing = preSmoothing
+        self.postSmoothing = postSmoothing
+        # The residual cannot fall far below the rounding error of the mesh's floating point type
+        self.tolerance = max(tolerance, 100*np.finfo(mesh.dtype).eps)
+        self.maxCycles = maxCycles
+        
+        self.levels = [multigridLevel(mesh)]
+        dx = mesh.dx
+        dz = mesh.dz
+        xNCells = mesh.xNCells
+        zNCells = mesh.zNCells
+        while (
+            xNCells%2 == 0 and zNCells%2 == 0 and
+            xNCells/2 >= coarsestCells and zNCells/2 >= coarsestCells
+        ):
+            dx *= 2.
+            dz *= 2.
+            xNCells /= 2
+            zNCells /= 2
+            coarseMesh = cubeMesh2D(
+                xmin=mesh.xmin, xmax=mesh.xmax, dx=dx, xPeriodic=mesh.xPeriodic,
+                zmin=mesh.zmin, zmax=mesh.zmax, dz=dz, zPeriodic=mesh.zPeriodic, dtype=mesh.dtype
+            )
+            self.levels.append(multigridLevel(coarseMesh))
+        
+        self.coarsestSolver = finiteVolumeFunctions(self.levels[-1].mesh)
+        
+        self.residualHistory = []
+    
+    def restrict(self, fine, coarse):
+        "Average the residual of the four fine cells making up each coarse cell"
+        residual = fine.residual()
+        coarse.source[:,:] = 0.25*(
+            residual[0::2,0::2] + residual[1::2,0::2] + residual[0::2,1::2] + residual[1::2,1::2]
+        )
+    
+    def prolong(self, coarse, fine):
+        "Bilinear interpolation of the coarse correction onto the fine cell centres"
+        padded = coarse.mesh.fillHalo(coarse.padded)
+        centre = padded[1:-1,1:-1]
+        for a, dk in ((0, -1), (1, 1)):
+            for b, di in ((0, -1), (1, 1)):
+                fine.field[a::2,b::2] += (
+                    0.5625*centre
+                    + 0.1875*padded[1+dk:padded.shape[0]-1+dk,1:-1]
+                    + 0.1875*padded[1:-1,1+di:padded.shape[1]-1+di]
+                    + 0.0625*padded[1+dk:padded.shape[0]-1+dk,1+di:padded.shape[1]-1+di]
+                )
+    
+    def cycleLevel(self, index):
+        level = self.levels[index]
+        
+        if index == len(self.levels)-1:
+            level.field[:,:] = self.coarsestSolver.poissonSolver(level.field, level.source)
+            return
+        
+        level.smooth(self.preSmoothing)
+        
+        coarse = self.levels[index+1]
+        self.restrict(level, coarse)
+        coarse.field[:,:] = 0.
+        
+        repeats = 2 if self.cycle == "W" else 1
+        for repeat in xrange(repeats):
+            self.cycleLevel(index+1)
+            if index+1 == len(self.levels)-1:
+                break
+        
+        self.prolong(coarse, level)
+        level.smooth(self.postSmoothing)
+    
+    def poissonSolver(self, field, solution):
+        """
+        Solve laplacian(field) = solution, using field as the initial guess. Cycles stop once the
+        RMS residual relative to the RMS source falls below tolerance; the residual after every
+        cycle is recorded in residualHistory.
+        """
+        finest = self.levels[0]
+        finest.field[:,:] = field
+        finest.source[:,:] = solution - solution.mean()
+        
+        sourceNorm = max(np.sqrt(np.mean(finest.source**2)), 1e-300)
+        self.residualHistory = [np.sqrt(np.mean(finest.residual()**2))]
+        
+        for cycle in xrange(self.maxCycles):
+            if self.residualHistory[-1]/sourceNorm < self.tolerance:
+                break
+            self.cycleLevel(0)
+            self.residualHistory.append(np.sqrt(np.mean(finest.residual()**2)))
+        
+        return finest.field - finest.field.mean()
\ No newline at end of file
@@ -0,0 +1,149 @@
+import os
+import json
+import shutil
+import hashlib
+import itertools
+import traceback
+import multiprocessing
+import resource
+import numpy as np
+
+def parameterGrid(grid):
+    """
+    Every combination of the values in grid, a dictionary of lists, as a list of dictionaries.
+    grid may also be a list of such dictionaries, whose combinations are joined without repeats.
+    """
+    if isinstance(grid, dict):
+        grid = [grid]
+    
+    cases = []
+    for subGrid in grid:
+        names = sorted(subGrid.keys())
+        for values in itertools.product(*[subGrid[name] for name in names]):
+            parameters = dict(zip(names, values))
+            if parameters not in cases:
+                cases.append(parameters)
+    
+    return cases
+
+def sourceVersion(paths):
+    """
+    Hash of the source files a case depends on, given as files or folders (of .py files), to use
+    as the version of a parameterSweep so that cached runs are repeated when the code changes
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, subFolders, names in os.walk(path):
+                files += [os.path.join(folder, name) for name in names if name.endswith(".py")]
+        else:
+            files.append(path)
+    
+    digest = hashlib.sha1()
+    for path in sorted(files):
+        with open(path, "rb") as sourceFile:
+            digest.update(sourceFile.read())
+    
+    return digest.hexdigest()
+
+def caseKey(caseName, parameters, version=""):
+    "Hash of the inputs of a run, which names its folder in the cache"
+    inputs = json.dumps({"case": caseName, "parameters": parameters, "version": version}, sort_keys=True)
+    return hashlib.sha1(inputs.encode("utf-8")).hexdigest()
+
+def limitMemory(memoryBudget):
+    "Limit the address space of a worker, so a run over budget raises MemoryError instead of swapping"
+    if memoryBudget is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memoryBudget, memoryBudget))
+
+def runCase(arguments):
+    "Run one case in a worker and store its results, returning an error message or None"
+    case, parameters, path = arguments
+    try:
+        results = case(**parameters)
+        
+        # Written next to the cache entry and then renamed, so an interrupted run leaves no entry
+        newPath = path + ".new"
+        if os.path.isdir(newPath):
+            shutil.rmtree(newPath)
+        os.makedirs(newPath)
+        np.savez(os.path.join(newPath, "results.npz"), **results)
+        with open(os.path.join(newPath, "parameters.json"), "w") as parametersFile:
+            json.dump(parameters, parametersFile, sort_keys=True)
+        os.rename(newPath, path)
+    except Exception:
+        return "{}: {}".format(parameters, traceback.format_exc())
+    
+    return None
+
+class parameterSweep:
+    """
+    Runs case(**parameters) for every combination of a parameter grid on a pool of worker
+    processes, caching the results. case must be a module-level function returning a dictionary
+    of arrays (or numbers), which are stored in the folder path under a hash of the case name,
+    its parameters and version, which should change whenever the case itself does (see
+    sourceVersion). Runs found in the cache are not repeated, so rerunning an interrupted sweep
+    resumes where it stopped.
+    Each worker is limited to memoryBudget bytes (None for no limit), and there are at most as
+    many workers as fit in the physical memory.
+    """
+    def __init__(self, path, case, version="", workers=None, memoryBudget=2**30):
+        self.path = path
+        self.case = case
+        self.version = version
+        self.memoryBudget = memoryBudget
+        
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if memoryBudget is not None:
+            physicalMemory = os.sysconf("SC_PAGE_SIZE")*os.sysconf("SC_PHYS_PAGES")
+            workers = min(workers, max(physicalMemory//memoryBudget, 1))
+        self.workers = workers
+        
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    
+    def casePath(self, parameters):
+        return os.path.join(self.path, caseKey(self.case.__name__, parameters, self.version))
+    
+    def cached(self, parameters):
+        return os.path.isdir(self.casePath(parameters))
+    
+    def load(self, parameters):
+        "Results of a cached run, as a dictionary of arrays"
+        with np.load(os.path.join(self.casePath(parameters), "results.npz")) as results:
+            return dict((name, results[name]) for name in results.files)
+    
+    def run(self, grid):
+        """
+        Run the cases of grid (a dictionary of lists of values, or a list of them) which are not
+        cached, and return the list of (parameters, results) of every case, in the order of
+        parameterGrid(grid).
+        Raises RuntimeError after the other runs have finished if any run failed.
+        """
+        cases = parameterGrid(grid)
+        pending = [parameters for parameters in cases if not self.cached(parameters)]
+        print "{} cases, {} cached, running {} on {} workers".format(len(cases), len(cases)-len(pending), len(pending), self.workers)
+        
+        errors = []
+        if len(pending) > 0:
+            # A fresh process for each run returns its memory to the system
+            pool = multiprocessing.Pool(self.workers, initializer=limitMemory, initargs=(self.memoryBudget,), maxtasksperchild=1)
+            try:
+                arguments = [(self.case, parameters, self.casePath(parameters)) for parameters in pending]
+                for index, error in enumerate(pool.imap_unordered(runCase, arguments)):
+                    print "Completed {}/{} runs".format(index+1, len(pending))
+                    if error is not None:
+                        print error
+                        errors.append(error)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        
+        if len(errors) > 0:
+            raise RuntimeError("{} of {} runs failed, see above".format(len(errors), len(pending)))
+        
+        return [(parameters, self.load(parameters)) for parameters in cases]
\ No newline at end of file
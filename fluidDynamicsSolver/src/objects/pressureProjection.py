@@ -0,0 +1,157 @@
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as sparseLinalg
+from scipy.sparse.csgraph import connected_components
+from .finiteVolumeCalculations import finiteVolumeFunctions
+
+def probeColours(nCells, periodic, spacing):
+    "Colour of each cell along an axis, with cells of the same colour at least spacing cells apart"
+    colours = np.arange(nCells) % spacing
+    if periodic and nCells % spacing != 0:
+        # Cells after the last whole group get colours of their own, as they are close to the first
+        # cells across the boundary
+        last = nCells - nCells % spacing
+        colours[last:] = spacing + np.arange(nCells - last)
+    
+    return colours
+
+class pressureProjection:
+    """
+    Chorin projection for incompressible flow on the collocated mesh. The correction is
+    u = u - dt*grad(p), with the boundary conditions applied to grad(p) as they are to u, and p
+    solves div(grad(p)) = div(u)/dt with the matrix of that composed operator (see operatorMatrices),
+    rather than the 5-point Laplacian. The projected cell velocities are then divergence free to
+    round-off, as measured by div(1, u, "linear") which interpolates them onto the faces.
+    The gradient of each cell only uses its second neighbours, which splits the mesh into sub-grids
+    which are not coupled (the checkerboard modes of a collocated mesh), so p is only defined up
+    to a constant on each of them. p is the kinematic pressure (pressure/density).
+    """
+    # Cells reached by the composed operator in each direction, grad then div both reaching one
+    stencilReach = 2
+    
+    def __init__(self, fvc):
+        self.fvc = fvc
+        self.mesh = fvc.mesh
+        
+        self.ones = self.mesh.interior(self.mesh.haloScalarField.copy())
+        self.ones += 1.
+        
+        self.divergence = self.mesh.volScalarField.copy()
+        self.gradPressure = self.mesh.volVectorField.copy(order="K")
+        self.pressure = self.mesh.interior(self.mesh.haloScalarField.copy())
+        
+        self.factorisation = None
+        self.signature = None
+    
+    def gradient(self, fvc, pressure, out=None):
+        "grad(pressure) with the boundary conditions of the velocity, as subtracted by project"
+        gradPressure = fvc.grad(pressure, "linear", out=out)
+        fvc.setBoundaryConditions(gradPressure)
+        
+        return gradPressure
+    
+    def operatorMatrices(self):
+        """
+        Sparse (CSR) matrices of the gradient (with rows for the x then z components) and of the
+        composed operator on one member of the mesh. They are assembled by applying the operators
+        to fields which are 1 on every cell of one colour (see probeColours), whose stencils do not
+        overlap, so each result belongs to a single column.
+        """
+        mesh = self.mesh.member()
+        fvc = finiteVolumeFunctions(mesh)
+        ones = mesh.interior(mesh.haloScalarField.copy())
+        ones += 1.
+        
+        spacing = 2*self.stencilReach + 1
+        xColours = probeColours(mesh.xNCells, mesh.xPeriodic, spacing)
+        zColours = probeColours(mesh.zNCells, mesh.zPeriodic, spacing)
+        index = np.arange(mesh.xNCells*mesh.zNCells).reshape(mesh.zNCells, mesh.xNCells)
+        
+        # Entries of the x gradient, z gradient and composed operator rows
+        entries = [([], [], []) for operator in xrange(3)]
+        for zColour in np.unique(zColours):
+            for xColour in np.unique(xColours):
+                probe = (zColours[:,None] == zColour) & (xColours[None,:] == xColour)
+                pressure = mesh.interior(mesh.haloScalarField.copy())
+                pressure[probe] = 1.
+                gradPressure = self.gradient(fvc, pressure)
+                results = [gradPressure[...,0], gradPressure[...,1], fvc.div(ones, gradPressure, "linear")]
+                
+                # The probed cell within reach of each cell
+                probeZ, probeX = np.nonzero(probe)
+                owner = np.zeros(index.shape, dtype=index.dtype) - 1
+                for zOffset in xrange(-self.stencilReach, self.stencilReach+1):
+                    for xOffset in xrange(-self.stencilReach, self.stencilReach+1):
+                        z = probeZ + zOffset
+                        x = probeX + xOffset
+                        if mesh.zPeriodic:
+                            z %= mesh.zNCells
+                        if mesh.xPeriodic:
+                            x %= mesh.xNCells
+                        inside = (z >= 0) & (z < mesh.zNCells) & (x >= 0) & (x < mesh.xNCells)
+                        owner[z[inside], x[inside]] = index[probeZ[inside], probeX[inside]]
+                
+                for (rows, columns, values), result in zip(entries, results):
+                    nonzero = result != 0.
+                    rows.append(index[nonzero])
+                    columns.append(owner[nonzero])
+                    values.append(result[nonzero])
+        
+        matrices = []
+        for rows, columns, values in entries:
+            matrix = sparse.coo_matrix(
+                (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                shape=(index.size, index.size)
+            )
+            matrices.append(matrix.tocsr())
+        
+        return sparse.vstack(matrices[:2]).tocsr(), matrices[2]
+    
+    def factorise(self):
+        """
+        Factorise the matrix of the composed operator. Its null space is that of the gradient,
+        the fields which are constant on each set of cells coupled by the gradient (sub-grids),
+        so one cell of each is pinned.
+        """
+        gradMatrix, matrix = self.operatorMatrices()
+        nSubGrids, self.subGrids = connected_components(gradMatrix.T*gradMatrix, directed=False)
+        self.pins = np.array([np.flatnonzero(self.subGrids == subGrid)[0] for subGrid in xrange(nSubGrids)])
+        
+        matrix = matrix.tolil()
+        for pin in self.pins:
+            matrix[pin,:] = 0.
+            matrix[pin,pin] = 1.
+        
+        self.factorisation = sparseLinalg.factorized(matrix.tocsc())
+        self.subGridSizes = np.bincount(self.subGrids)
+    
+    def project(self, u, dt):
+        """
+        Remove the divergent part of u in place, returning the kinematic pressure. The boundary
+        conditions of u are applied first, and still hold for the projected u.
+        """
+        signature = self.fvc.meshSignature()
+        if self.factorisation is None or self.signature != signature:
+            self.factorise()
+            self.signature = signature
+        
+        self.fvc.setBoundaryConditions(u)
+        self.fvc.div(self.ones, u, "linear", out=self.divergence)
+        self.divergence /= dt
+        
+        # Ensemble members are solved together, as the columns of the right hand side
+        ensembleShape = self.mesh.ensembleShape
+        source = np.reshape(self.divergence, ensembleShape+(-1,)).copy()
+        source[...,self.pins] = 0.
+        pressure = self.factorisation(source.T).T
+        
+        # Zero mean on each sub-grid
+        for member in np.ndindex(*ensembleShape):
+            pressure[member] -= (np.bincount(self.subGrids, weights=pressure[member])/self.subGridSizes)[self.subGrids]
+        self.pressure[...] = np.reshape(pressure, self.mesh.volScalarField.shape)
+        
+        self.gradient(self.fvc, self.pressure, out=self.gradPressure)
+        self.gradPressure *= dt
+        u -= self.gradPressure
+        
+        return self.pressure
\ No newline at end of file
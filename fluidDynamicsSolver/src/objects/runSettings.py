@@ -1,7 +1,11 @@
 import numpy as np
 
 class runSettings:
-    def __init__(self, tStart=0., tEnd=1000., dt=1., writeInterval=0., plotInterval=0.):
+    def __init__(
+        self, tStart=0., tEnd=1000., dt=1., writeInterval=0., plotInterval=0., 
+        adaptive=False, targetCourant=0.5, dtMin=0., dtMax=np.inf, maxGrowth=1.2,
+        convergenceWindow=0, convergenceTolerance=1e-4, convergenceStride=4, convergenceChecks=3
+    ):
         self.tStart = tStart
         self.tEnd = tEnd
         self.dt = dt
@@ -12,10 +16,164 @@ class runSettings:
         self.writeInterval = writeInterval
         self.plotInterval = plotInterval
         
+        # Adaptive timestepping, dt is set each step by adjustTimestep to reach targetCourant
+        self.adaptive = adaptive
+        self.targetCourant = targetCourant
+        self.dtMin = dtMin
+        self.dtMax = dtMax
+        self.maxGrowth = maxGrowth
+        
+        # Timestep before it is shortened to land on an output time
+        self.dtStable = dt
+        self.landingTime = None
+        self.outputsDue = []
+        
+        # Early termination once the norms of the fields change by less than convergenceTolerance
+        # (relative) over convergenceWindow steps, for convergenceChecks windows in a row (a window
+        # of 0 disables it), see checkConvergence
+        self.convergenceWindow = convergenceWindow
+        self.convergenceTolerance = convergenceTolerance
+        self.convergenceStride = convergenceStride
+        self.convergenceChecks = convergenceChecks
+        self.convergedChecks = 0
+        self.norms = None
+        self.residuals = []
+        self.converged = False
+        
+    # Attributes which define the progress of the run, saved in checkpoints
+    progress = [
+        "currentTime", "currentTimeIndex", "dt", "dtStable", "landingTime", "outputsDue",
+        "convergedChecks", "norms", "residuals", "converged"
+    ]
+    
+    def getState(self):
+        "Progress of the run, for checkpoints"
+        return dict((name, getattr(self, name)) for name in self.progress)
+    
+    def setState(self, state):
+        """
+        Restore the progress of a run. Everything else (tEnd, the output intervals and the
+        timestepping and convergence settings) is kept as given to this runSettings, so a restart
+        takes them from the script. The step after a restart still lands on the output time it was
+        shortened for with the previous settings.
+        """
+        for name in self.progress:
+            if name in state:
+                setattr(self, name, state[name])
+        self.t = np.arange(self.tStart, self.tEnd, self.dt)
+    
+    def nextOutputTime(self, interval):
+        "First multiple of interval after the current time"
+        if interval <= 0.:
+            return np.inf
+        return (np.floor(self.currentTime/interval + 1e-9) + 1.)*interval
+    
+    def courantRate(self, u, mesh, soundSpeed=0.):
+        "Maximum Courant number per unit time, including the sound speed for acoustic waves"
+        rate = (np.abs(u[...,0]) + soundSpeed)/mesh.dx + (np.abs(u[...,1]) + soundSpeed)/mesh.dz
+        return np.max(rate)
+    
+    def subcycles(self, rate, dt):
+        "Number of equal substeps of dt which keep the Courant number for the given rate within targetCourant"
+        return max(1, int(np.ceil(dt*rate/self.targetCourant - 1e-9)))
+    
+    def courantNumber(self, u, mesh, soundSpeed=0.):
+        "Maximum Courant number over the mesh for the current timestep"
+        return self.dt*self.courantRate(u, mesh, soundSpeed)
+    
+    def adjustTimestep(self, u, mesh, soundSpeed=0.):
+        """
+        In adaptive mode, grow (by at most maxGrowth) or shrink dt towards targetCourant, then 
+        shorten it if necessary so that the step lands exactly on the next plot/write time or tEnd.
+        Call before updateTime, with the fields the next step starts from.
+        """
+        if not self.adaptive:
+            return self.dt
+        
+        rate = self.courantRate(u, mesh, soundSpeed)
+        if rate > 0.:
+            dtCourant = self.targetCourant/rate
+        else:
+            dtCourant = self.dtMax
+        
+        self.dtStable = min(dtCourant, self.maxGrowth*self.dtStable, self.dtMax)
+        self.dtStable = max(self.dtStable, self.dtMin)
+        
+        nextPlot = self.nextOutputTime(self.plotInterval)
+        nextWrite = self.nextOutputTime(self.writeInterval)
+        landingTime = min(nextPlot, nextWrite, self.tEnd)
+        
+        self.dt = self.dtStable
+        self.landingTime = None
+        self.outputsDue = []
+        if self.currentTime + self.dt >= landingTime - 1e-6*self.dt:
+            self.dt = landingTime - self.currentTime
+            self.landingTime = landingTime
+            if landingTime == nextPlot:
+                self.outputsDue.append("plot")
+            if landingTime == nextWrite:
+                self.outputsDue.append("write")
+        
+        return self.dt
+        
+    def checkConvergence(self, fields, mesh):
+        """
+        Every convergenceWindow steps, compare the norm of each field with that of the last check,
+        taking every convergenceStride-th row and column. residuals holds the relative change in
+        each norm, which is unaffected by structures moving through the periodic mesh. Once all are
+        below convergenceTolerance at convergenceChecks checks in a row, so that a passing lull in
+        an oscillation does not end the run, converged is set and updateTime ends the run. Call
+        after each step.
+        """
+        if self.convergenceWindow <= 0 or self.currentTimeIndex % self.convergenceWindow != 0:
+            return self.converged
+        
+        stride = slice(None, None, self.convergenceStride)
+        norms = []
+        for field in fields:
+            if mesh.isVector(field):
+                norms.append(float(np.linalg.norm(field[...,stride,stride,:])))
+            else:
+                norms.append(float(np.linalg.norm(field[...,stride,stride])))
+        
+        if self.norms is not None:
+            self.residuals = [
+                abs(norm - previous)/max(previous, np.finfo(np.float64).tiny) for norm, previous in zip(norms, self.norms)
+            ]
+            if max(self.residuals) < self.convergenceTolerance:
+                self.convergedChecks += 1
+            else:
+                self.convergedChecks = 0
+            self.converged = self.convergedChecks >= self.convergenceChecks
+        
+        self.norms = norms
+        return self.converged
+    
     def updateTime(self):
-        self.currentTime += self.dt
+        if self.converged:
+            return False
+        
+        if self.adaptive and self.currentTime >= self.tEnd:
+            return False
+        
+        if self.adaptive and self.landingTime is not None:
+            # Land exactly on the output time rather than accumulating round-off
+            self.currentTime = self.landingTime
+        else:
+            self.currentTime += self.dt
         self.currentTimeIndex += 1
         return (self.currentTime <= self.tEnd)
     
     def plotFigures(self):
-        return ((self.currentTime+self.dt/1000.)%self.plotInterval < self.dt/100.)
\ No newline at end of file
+        if self.plotInterval <= 0.:
+            return False
+        if self.adaptive:
+            return "plot" in self.outputsDue
+        return ((self.currentTime+self.dt/1000.)%self.plotInterval < self.dt/100.)
+    
+    def writeData(self):
+        if self.writeInterval <= 0.:
+            return False
+        if self.adaptive:
+            return "write" in self.outputsDue
+        return ((self.currentTime+self.dt/1000.)%self.writeInterval < self.dt/100.)
\ No newline at end of file
@@ -0,0 +1,156 @@
+import os
+import json
+import threading
+import traceback
+import Queue
+import numpy as np
+
+class snapshotWriter:
+    """
+    Writes snapshots of fields to an append-only store in a background thread, so that the solver
+    loop does not wait on the disk. write(time, fields) copies the fields and returns; the copies
+    are appended to one raw binary file per field (<name>.bin), then the time to time.bin, so that
+    time.bin only lists complete snapshots. Up to queueSize snapshots may wait to be written, after
+    which write blocks. With append=True an existing store with the same fields is extended, after
+    truncate(time) to drop the snapshots past the time a run is restarted from.
+    The store is read back, as memory maps, with readSnapshots.
+    """
+    def __init__(self, folder, names, queueSize=4, append=False):
+        self.folder = folder
+        self.names = names
+        self.append = append
+        
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        
+        self.queue = Queue.Queue(maxsize=queueSize)
+        self.files = None
+        self.error = None
+        
+        self.thread = threading.Thread(target=self.worker)
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def open(self, snapshot):
+        "Write the description of the fields and open the files, on the first snapshot"
+        metadata = {
+            "names": self.names,
+            "dtypes": [field.dtype.str for field in snapshot],
+            "shapes": [field.shape for field in snapshot]
+        }
+        
+        metadataPath = os.path.join(self.folder, "fields.json")
+        mode = "wb"
+        if self.append and os.path.isfile(metadataPath):
+            with open(metadataPath) as metadataFile:
+                existing = json.load(metadataFile)
+            if existing != json.loads(json.dumps(metadata)):
+                raise ValueError("Cannot append to {}, its fields differ".format(self.folder))
+            mode = "ab"
+            
+            # Drop any part of a snapshot which was not completed, e.g. if the previous run was killed
+            count = os.path.getsize(os.path.join(self.folder, "time.bin"))//8
+            for name, field in zip(self.names, snapshot):
+                with open(os.path.join(self.folder, name+".bin"), "ab") as dataFile:
+                    dataFile.truncate(count*field.nbytes)
+        
+        with open(metadataPath, "w") as metadataFile:
+            json.dump(metadata, metadataFile)
+        
+        self.files = [open(os.path.join(self.folder, name+".bin"), mode) for name in self.names]
+        self.timeFile = open(os.path.join(self.folder, "time.bin"), mode)
+    
+    def truncate(self, time):
+        "Drop the snapshots written after time, e.g. past the checkpoint a run is restarted from"
+        if self.files is not None:
+            raise RuntimeError("Snapshots can only be truncated before the first write")
+        
+        metadataPath = os.path.join(self.folder, "fields.json")
+        if not os.path.isfile(metadataPath):
+            return
+        with open(metadataPath) as metadataFile:
+            metadata = json.load(metadataFile)
+        
+        times = np.fromfile(os.path.join(self.folder, "time.bin"), dtype=np.float64)
+        later = np.flatnonzero(times > time)
+        count = later[0] if len(later) > 0 else len(times)
+        
+        for name, dtype, shape in zip(metadata["names"], metadata["dtypes"], metadata["shapes"]):
+            with open(os.path.join(self.folder, name+".bin"), "ab") as dataFile:
+                dataFile.truncate(count*np.dtype(dtype).itemsize*int(np.prod(shape)))
+        with open(os.path.join(self.folder, "time.bin"), "ab") as timeFile:
+            timeFile.truncate(count*8)
+    
+    def write(self, time, fields):
+        "Queue a copy of the fields (in the order of names) at the given time"
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        
+        snapshot = [np.array(field, copy=True, order="C") for field in fields]
+        if self.files is None:
+            self.open(snapshot)
+        
+        self.queue.put((time, snapshot))
+    
+    def worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            
+            time, snapshot = item
+            if self.error is not None:
+                # The failed snapshot may be partly written, so later ones would not line up with time.bin
+                self.queue.task_done()
+                continue
+            
+            try:
+                for dataFile, field in zip(self.files, snapshot):
+                    field.tofile(dataFile)
+                    dataFile.flush()
+                np.array([time], dtype=np.float64).tofile(self.timeFile)
+                self.timeFile.flush()
+            except Exception:
+                # Reported by the next write or close; later snapshots are discarded
+                self.error = traceback.format_exc()
+            self.queue.task_done()
+    
+    def flush(self):
+        "Wait for the queued snapshots to be written, e.g. before a checkpoint"
+        self.queue.join()
+        
+        if self.error is not None:
+            raise RuntimeError(self.error)
+    
+    def close(self):
+        "Wait for the queued snapshots to be written and close the files"
+        self.queue.put(None)
+        self.thread.join()
+        
+        if self.files is not None:
+            for dataFile in self.files + [self.timeFile]:
+                dataFile.close()
+        
+        if self.error is not None:
+            raise RuntimeError(self.error)
+
+def readSnapshots(folder):
+    """
+    Times and fields of a store written by snapshotWriter. Each field is a read-only memory map
+    with the snapshot as its first index, so only the snapshots used are read from the disk.
+    """
+    with open(os.path.join(folder, "fields.json")) as metadataFile:
+        metadata = json.load(metadataFile)
+    
+    times = np.fromfile(os.path.join(folder, "time.bin"), dtype=np.float64)
+    
+    fields = {}
+    for name, dtype, shape in zip(metadata["names"], metadata["dtypes"], metadata["shapes"]):
+        shape = (len(times),) + tuple(shape)
+        if len(times) == 0:
+            fields[name] = np.empty(shape, dtype=dtype)
+        else:
+            fields[name] = np.memmap(os.path.join(folder, name+".bin"), dtype=dtype, mode="r", shape=shape)
+    
+    return times, fields
\ No newline at end of file
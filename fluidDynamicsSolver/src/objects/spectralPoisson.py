@@ -0,0 +1,50 @@
+import numpy as np
+import scipy.fftpack as fftpack
+
+class spectralPoissonSolver:
+    """
+    Direct O(N log N) solver for the 5-point laplacian(field) = solution on a cubeMesh2D. The
+    discrete operator is diagonalised by an FFT along periodic axes and by a DCT (type II) along
+    zero-gradient axes, so any combination of xPeriodic/zPeriodic is supported.
+    """
+    def __init__(self, mesh):
+        self.mesh = mesh
+        
+        eigenvaluesX = self.eigenvalues(mesh.xNCells, mesh.dx, mesh.xPeriodic)
+        eigenvaluesZ = self.eigenvalues(mesh.zNCells, mesh.dz, mesh.zPeriodic)
+        self.eigenvalues2D = eigenvaluesZ[:,None] + eigenvaluesX[None,:]
+        
+        #Constant mode is undetermined, it is set to zero to give the zero-mean solution
+        self.eigenvalues2D[0,0] = 1.
+        self.inverseEigenvalues = 1./self.eigenvalues2D
+        self.inverseEigenvalues[0,0] = 0.
+        
+        # Mesh axes are the last two, so that fields with an ensemble axis are transformed member by member
+        self.periodicAxes = [axis for axis, periodic in ((-2, mesh.zPeriodic), (-1, mesh.xPeriodic)) if periodic]
+        self.wallAxes = [axis for axis, periodic in ((-2, mesh.zPeriodic), (-1, mesh.xPeriodic)) if not periodic]
+    
+    def eigenvalues(self, nCells, spacing, periodic):
+        "Eigenvalues of the 1D second difference with periodic or zero-gradient boundaries"
+        k = np.arange(nCells)
+        if periodic:
+            return -4.*np.sin(np.pi*k/nCells)**2/spacing**2
+        else:
+            return -4.*np.sin(0.5*np.pi*k/nCells)**2/spacing**2
+    
+    def forward(self, field):
+        for axis in self.wallAxes:
+            field = fftpack.dct(field, type=2, axis=axis, norm="ortho")
+        if self.periodicAxes != []:
+            field = np.fft.fftn(field, axes=self.periodicAxes)
+        return field
+    
+    def inverse(self, field):
+        if self.periodicAxes != []:
+            field = np.fft.ifftn(field, axes=self.periodicAxes).real
+        for axis in self.wallAxes:
+            field = fftpack.idct(field, type=2, axis=axis, norm="ortho")
+        return field
+    
+    def poissonSolver(self, field, solution):
+        "Solve laplacian(field) = solution, returning the zero-mean solution"
+        return self.inverse(self.forward(solution)*self.inverseEigenvalues).astype(self.mesh.dtype, copy=False)
\ No newline at end of file
@@ -0,0 +1,99 @@
+import numpy as np
+
+# Carpenter & Kennedy (1994) five-stage, fourth-order, two-register Runge-Kutta coefficients
+lowStorageRK4A = [
+    0.,
+    -567301805773./1357537059087.,
+    -2404267990393./2016746695238.,
+    -3550918686646./2091501179385.,
+    -1275806237668./842570457699.
+]
+lowStorageRK4B = [
+    1432997174477./9575080441755.,
+    5161836677717./13612068292357.,
+    1720146321549./2090206949498.,
+    3134564353537./4481467310338.,
+    2277821191437./14882151754819.
+]
+
+class timeIntegrator:
+    """
+    Explicit time integration of d(state)/dt = rightHandSide(state) for a list of fields, updated
+    in place so that fields stored with a halo keep their storage. rightHandSide(state, tendency)
+    must write the tendency of each field into the matching array of tendency. The optional
+    boundaryConditions(state) is applied after every stage.
+    Schemes: "euler", "sspRK2", "sspRK3" (strong-stability-preserving, Shu & Osher) and
+    "lowStorageRK4" (five stages, two registers).
+    """
+    def __init__(self, state, rightHandSide, scheme="sspRK3", boundaryConditions=None):
+        self.rightHandSide = rightHandSide
+        self.scheme = scheme
+        self.boundaryConditions = boundaryConditions
+
+        if scheme not in ["euler", "sspRK2", "sspRK3", "lowStorageRK4"]:
+            raise ValueError("Unknown time integration scheme: {}".format(scheme))
+
+        self.tendency = [np.empty_like(field) for field in state]
+        # Start of step values (SSP schemes) or accumulated increment (low storage RK4)
+        self.register = [np.zeros_like(field) for field in state]
+
+        self.stages = {"euler": 1, "sspRK2": 2, "sspRK3": 3, "lowStorageRK4": 5}[scheme]
+
+    def evaluate(self, state):
+        self.rightHandSide(state, self.tendency)
+
+    def applyBoundaryConditions(self, state):
+        if self.boundaryConditions is not None:
+            self.boundaryConditions(state)
+
+    def eulerStage(self, state, dt):
+        "state = state + dt*rightHandSide(state)"
+        self.evaluate(state)
+        for field, tendency in zip(state, self.tendency):
+            tendency *= dt
+            field += tendency
+        self.applyBoundaryConditions(state)
+
+    def blend(self, state, weight):
+        "state = weight*state + (1-weight)*register"
+        for field, register, scratch in zip(state, self.register, self.tendency):
+            field *= weight
+            np.multiply(register, 1.-weight, out=scratch)
+            field += scratch
+        self.applyBoundaryConditions(state)
+
+    def step(self, state, dt):
+        "Advance the list of fields in state by dt"
+        if self.scheme == "euler":
+            self.eulerStage(state, dt)
+
+        elif self.scheme == "sspRK2":
+            for field, register in zip(state, self.register):
+                register[...] = field
+            self.eulerStage(state, dt)
+            self.eulerStage(state, dt)
+            self.blend(state, 0.5)
+
+        elif self.scheme == "sspRK3":
+            for field, register in zip(state, self.register):
+                register[...] = field
+            self.eulerStage(state, dt)
+            self.eulerStage(state, dt)
+            self.blend(state, 0.25)
+            self.eulerStage(state, dt)
+            self.blend(state, 2./3.)
+
+        elif self.scheme == "lowStorageRK4":
+            for register in self.register:
+                register[...] = 0.
+            for a, b in zip(lowStorageRK4A, lowStorageRK4B):
+                self.evaluate(state)
+                for field, register, tendency in zip(state, self.register, self.tendency):
+                    register *= a
+                    tendency *= dt
+                    register += tendency
+                    np.multiply(register, b, out=tendency)
+                    field += tendency
+                self.applyBoundaryConditions(state)
+
+        return state
\ No newline at end of file
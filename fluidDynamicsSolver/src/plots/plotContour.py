@@ -5,6 +5,42 @@ matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import matplotlib.tri as tri
 import matplotlib.transforms as tr
+import struct
+import zlib
+import collections
+import numpy as np
+
+# Figures of the raster path, reused between frames, keyed by the grid and the plot settings.
+# Only the maxRasterFigures most recently used are kept open.
+rasterFigures = collections.OrderedDict()
+maxRasterFigures = 4
+
+def closeRasterFigures():
+    "Close the figures kept by the raster path"
+    while len(rasterFigures) > 0:
+        key, figure = rasterFigures.popitem()
+        plt.close(figure.fig)
+
+def regularGrid(x, y):
+    """
+    Extent and origin for imshow if x and y are the coordinates of a uniform structured grid, with
+    x along the rows and y down the columns (e.g. cubeMesh2D.x and cubeMesh2D.z), otherwise None
+    """
+    if x.ndim != 2 or x.shape != y.shape or min(x.shape) < 2:
+        return None
+    if not (np.all(x == x[:1]) and np.all(y == y[:,:1])):
+        return None
+    
+    xLine = x[0]
+    yLine = y[:,0]
+    dx = np.diff(xLine)
+    dy = np.diff(yLine)
+    if not (np.allclose(dx, dx[0]) and np.allclose(dy, dy[0])) or dx[0] <= 0. or dy[0] == 0.:
+        return None
+    
+    extent = (xLine[0]-0.5*dx[0], xLine[-1]+0.5*dx[0], min(yLine)-0.5*abs(dy[0]), max(yLine)+0.5*abs(dy[0]))
+    origin = "lower" if dy[0] > 0. else "upper"
+    return extent, origin
 
 def plotContour(x, y, z, filename, 
         cmap="bwr", 
@@ -18,7 +54,15 @@ def plotContour(x, y, z, filename,
         vmin=0., 
         vmax=1.,
         hide_labels=True,
-        equal_aspect_ratio=True):
+        equal_aspect_ratio=True,
+        raster=True):
+    
+    # Fields on a uniform structured grid are drawn as an image, reusing the figure between frames
+    grid = regularGrid(np.asarray(x), np.asarray(y)) if raster else None
+    if grid is not None:
+        plotRaster(grid, np.asarray(z), filename, cmap, folder, xlim, ylim, title, xlabel, ylabel,
+            levels, vmin, vmax, hide_labels, equal_aspect_ratio)
+        return
     
     # Ensure arrays are one dimensional for contour functions
     x = x.flatten()
@@ -30,7 +74,7 @@ def plotContour(x, y, z, filename,
         fig = plt.figure()
     else:
         fig = plt.figure(figsize=(1000/dpi,1000/dpi), dpi=dpi)
-
+    
     triang = tri.Triangulation(x, y)
     contours = plt.tricontourf(triang, z, levels, cmap=cmap, vmin=vmin, vmax=vmax)
     
@@ -61,4 +105,103 @@ def plotContour(x, y, z, filename,
         plt.savefig(os.path.join(folder, filename), dpi=dpi, bbox_inches="tight")
     else:
         plt.savefig(os.path.join(folder, filename), dpi=dpi)
-    plt.close()
\ No newline at end of file
+    plt.close()
+
+class rasterFigure:
+    "Figure, image and crop of the raster path, kept between frames"
+    def __init__(self, shape, extent, origin, cmap, levels, hide_labels, equal_aspect_ratio):
+        self.dpi = 200.
+        self.equal_aspect_ratio = equal_aspect_ratio
+        if equal_aspect_ratio:
+            self.fig = plt.figure(dpi=self.dpi)
+        else:
+            self.fig = plt.figure(figsize=(1000/self.dpi,1000/self.dpi), dpi=self.dpi)
+        
+        # The colormap is split into levels bands, as the contours of tricontourf are
+        self.axes = self.fig.gca()
+        self.image = self.axes.imshow(np.zeros(shape), cmap=plt.get_cmap(cmap, levels), extent=extent, 
+            origin=origin, interpolation="bilinear", aspect="equal" if equal_aspect_ratio else "auto")
+        
+        if hide_labels:
+            self.axes.tick_params(axis='both', labelleft=False, labeltop=False, labelright=False, labelbottom=False)
+        
+        self.suptitle = self.fig.suptitle("")
+        self.labels = None
+        self.crop = None
+    
+    def setLabels(self, labels):
+        "Update the limits, labels and title, and the layout if they have changed"
+        if labels == self.labels:
+            return
+        
+        xlim, ylim, title, xlabel, ylabel = labels
+        self.axes.set_xlim(xlim)
+        self.axes.set_ylim(ylim)
+        self.axes.set_xlabel(xlabel)
+        self.axes.set_ylabel(ylabel)
+        self.suptitle.set_text(title)
+        self.fig.tight_layout()
+        
+        self.labels = labels
+        self.crop = None
+    
+    def render(self):
+        "Draw the figure, returning the RGB pixels, cropped to its contents as bbox_inches='tight' does"
+        canvas = self.fig.canvas
+        canvas.draw()
+        width, height = canvas.get_width_height()
+        pixels = np.frombuffer(canvas.buffer_rgba(), dtype=np.uint8).reshape(height, width, 4)[...,:3]
+        
+        if self.crop is None:
+            self.crop = (slice(None), slice(None))
+            if self.equal_aspect_ratio:
+                bbox = self.fig.get_tightbbox(canvas.get_renderer()).padded(0.1)
+                x0, y0, x1, y1 = np.round(bbox.extents*self.dpi).astype(int)
+                self.crop = (slice(max(height-y1, 0), height-max(y0, 0)), slice(max(x0, 0), x1))
+        
+        return pixels[self.crop]
+
+def writePng(path, pixels, compression=1):
+    "Write an 8 bit RGB image to a PNG file, with fast zlib compression"
+    height, width = pixels.shape[:2]
+    
+    def chunk(kind, data):
+        content = kind + data
+        return struct.pack(">I", len(data)) + content + struct.pack(">I", zlib.crc32(content) & 0xffffffff)
+    
+    # Each row starts with its filter type, 0 for none
+    rows = np.zeros((height, 1 + 3*width), dtype=np.uint8)
+    rows[:,1:] = pixels.reshape(height, 3*width)
+    
+    with open(path, "wb") as pngFile:
+        pngFile.write(b"\x89PNG\r\n\x1a\n")
+        pngFile.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        pngFile.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), compression)))
+        pngFile.write(chunk(b"IEND", b""))
+
+def plotRaster(grid, z, filename, cmap, folder, xlim, ylim, title, xlabel, ylabel, levels, vmin, vmax, 
+        hide_labels, equal_aspect_ratio):
+    "Draw z as an image on the grid from regularGrid, reusing the figure of earlier frames"
+    extent, origin = grid
+    key = (z.shape, extent, origin, cmap, levels, hide_labels, equal_aspect_ratio)
+    if key in rasterFigures:
+        figure = rasterFigures.pop(key)
+    else:
+        figure = rasterFigure(z.shape, extent, origin, cmap, levels, hide_labels, equal_aspect_ratio)
+        while len(rasterFigures) >= maxRasterFigures:
+            oldKey, oldFigure = rasterFigures.popitem(last=False)
+            plt.close(oldFigure.fig)
+    rasterFigures[key] = figure
+    
+    # Only the data changes between most frames
+    figure.image.set_data(z)
+    figure.image.set_clim(vmin, vmax)
+    figure.setLabels((
+        tuple(xlim) if xlim != [] else extent[:2], tuple(ylim) if ylim != [] else extent[2:],
+        title, xlabel, ylabel
+    ))
+    
+    if folder == "":
+        folder = sys.path[0]
+    
+    writePng(os.path.join(folder, filename), figure.render())
\ No newline at end of file
@@ -1,5 +1,9 @@
-def dot(field1, field2):
-        return field1[:,:,0]*field2[:,:,0] + field1[:,:,1]*field2[:,:,1]
+import numpy as np
+
+def dot(field1, field2, out=None):
+        if out is None:
+            return field1[...,0]*field2[...,0] + field1[...,1]*field2[...,1]
+        return np.einsum("...i,...i->...", field1, field2, out=out)
         
 def mag(field):
-    return np.sqrt( self.dot(field, field) )
\ No newline at end of file
+    return np.sqrt( dot(field, field) )
\ No newline at end of file